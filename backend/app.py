@@ -1,19 +1,22 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 import asyncio
 from r5py import TransportNetwork
 
 from core.state import AppState
-from core.config import OSM_PBF, heightmodel, CITY_BBOX, CATS
+from core.config import OSM_PBF, heightmodel, CITY_BBOX, CATS, MEMORY_SAMPLED_PATHS
+from core.http_cache import data_version
+from core.memory import PeakSampler, record_request
 
 from services.overpass import fetch_pois_for_category
 from services.zensus import load_grid_df
-from services.districts import load_districts_gdf
+from services.districts import load_districts_gdf, build_district_payloads
 
 from routes.isochrone import router as isochrone_router
 from routes.pois import router as pois_router
 from routes.grid import router as grid_router
 from routes.districts import router as districts_router
 from routes.cityscope import router as cityscope_router
+from routes.memory import router as memory_router
 
 app = FastAPI()
 app.state.app_state = AppState()
@@ -26,7 +29,7 @@ async def startup():
     This performs one-time loading of heavyweight resources:
     - R5 transport network (OSM + elevation model)
     - census grid data (population)
-    - district geometries
+    - district geometries (plus pre-serialized, simplified GeoJSON payloads)
     - initial POI cache per category for the city bounding box
 
     The POI cache reduces repeated Overpass requests during interactive use.
@@ -39,7 +42,9 @@ async def startup():
     print("Netzwerk geladen")
 
     st.df_grid = load_grid_df()
+    st.grid_version = data_version(st.df_grid)
     st.districts_gdf = load_districts_gdf()
+    st.district_payloads = build_district_payloads(st.districts_gdf)
 
     st.poi_cache = {}
     print("Starte Initialisierung des POI-Caches...")
@@ -51,12 +56,47 @@ async def startup():
         # Rate limiting: avoid triggering Overpass throttling during warmup
         await asyncio.sleep(5)
 
+    st.poi_version = data_version(*st.poi_cache.values())
     print("POI-Cache initialisiert.")
 
 
+@app.middleware("http")
+async def sample_request_memory(request: Request, call_next):
+    """
+    Records the peak RSS growth of heavy requests in AppState.memory_stats.
+
+    Sampling covers the handler and the full response body.
+    """
+    if request.url.path not in MEMORY_SAMPLED_PATHS:
+        return await call_next(request)
+
+    sampler = PeakSampler().__enter__()
+    try:
+        response = await call_next(request)
+    except Exception:
+        sampler.__exit__(None, None, None)
+        raise
+
+    # call_next returns once the response starts; keep sampling until the body is
+    # sent so streamed responses (/api/cityscope/stream) are measured as they generate
+    body_iterator = response.body_iterator
+
+    async def sampled_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            sampler.__exit__(None, None, None)
+            record_request(app.state.app_state.memory_stats, request.url.path, sampler)
+
+    response.body_iterator = sampled_body()
+    return response
+
+
 # API routes
 app.include_router(isochrone_router)
 app.include_router(pois_router)
 app.include_router(grid_router)
 app.include_router(districts_router)
 app.include_router(cityscope_router)
+app.include_router(memory_router)
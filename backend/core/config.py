@@ -4,17 +4,71 @@ heightmodel = "data/hoehenmodell.tif"
 OSM_PBF = "data/duesseldorf-regbez-250910.osm.pbf"
 
 CITY_BBOX = [51.0679, 6.9357, 51.3221, 7.4343]
-CSV_PATH_GRID = "./data/census_100m_with_district.csv"
+# Census grid with district ids, as written by scripts/assign_districts.py.
+# A semicolon-separated .csv with the same columns is read as well.
+GRID_PATH = "./data/census_100m_with_district.parquet"
 
 DISTRICTS_SHP = "data/districts.shp"
 DISTRICT_ID_COL = "id"
 
+# Simplification tolerances (meters, EPSG:3035) for the pre-serialized district payloads.
+# 0 keeps the full-resolution shapefile geometry.
+DISTRICT_SIMPLIFY_LEVELS = [0, 5, 20, 80]
+
 WALK_SPEED = 4.7
 CYCLE_SPEED = 15
 
+# Memory accounting: RSS sampling interval (s) for requests to MEMORY_SAMPLED_PATHS.
+# With MEMORY_BUDGET_MB set, cityscope requests whose estimated memory would push the
+# process above the budget are downgraded to a coarser resolution or rejected (503).
+MEMORY_SAMPLE_INTERVAL = 0.05
+MEMORY_SAMPLED_PATHS = ["/api/cityscope", "/api/cityscope/stream", "/api/grid", "/api/isochrone"]
+MEMORY_BUDGET_MB = None
+
+# Response compression: bodies below this size are sent uncompressed.
+# Static payloads are precompressed once with the (slower) high levels.
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Number of origin cells per R5 TravelTimeMatrix call in /api/cityscope.
+# Each chunk is reduced to per-cell minima immediately, so peak memory scales
+# with chunk size x POIs instead of all cells x POIs.
+ROUTING_ORIGIN_CHUNK = 1000
+
+# Upper travel time limit for R5 matrix routing (minutes)
+ROUTING_MAX_TIME = 120
+
+# Search direction for matrix routing: "cells" (cells -> POIs), "pois" (POIs -> cells,
+# transposed) or "auto" (per category, search from the smaller side)
+ROUTING_DIRECTION = "auto"
+
+# Destination pruning in /api/cityscope: nearest POIs per cell routed first to get an
+# upper bound; the speed factor covers downhill speedups of R5's elevation model.
+# Seeds are routed up to PRUNE_SEED_DETOUR x their straight-line time (cells whose
+# seeds are farther by network fall back to a full search). Cells are pruned in square
+# tiles (meters) routed to their own candidates only; keep tiles well below
+# ROUTING_ORIGIN_CHUNK cells.
+PRUNE_SEED_K = 2
+PRUNE_SPEED_FACTOR = 1.25
+PRUNE_SEED_DETOUR = 2.0
+PRUNE_TILE_SIZE = 2000
+
+# Concave isochrone outlines: 0 = tightest hull, 1 = convex hull
+ISOCHRONE_CONCAVE_RATIO = 0.3
+
 CELL_SIZE = 100.0
 HALF = CELL_SIZE / 2.0
 
+# Allowed /api/cityscope output resolutions (meters); >100 aggregates cells to blocks
+CITYSCOPE_RESOLUTIONS = [100, 500, 1000, 2000]
+
+# Progressive /api/cityscope/stream: the coarse stage uses the smallest block size
+# with at most PROGRESSIVE_MAX_COARSE_CELLS blocks; 100m cells then follow in batches.
+PROGRESSIVE_COARSE_SIZES = [500, 1000, 2000]
+PROGRESSIVE_MAX_COARSE_CELLS = 400
+PROGRESSIVE_BATCH_CELLS = 2000
+
 # Category definitions used for POI retrieval via Overpass.
 # Keys must match the frontend category identifiers (lowercase).
 # Values define OSM tag filters used to build Overpass queries.
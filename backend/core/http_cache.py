@@ -0,0 +1,163 @@
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+
+import pandas as pd
+from fastapi import Request, Response
+
+from core.config import COMPRESS_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # optional: fall back to gzip only
+    brotli = None
+
+
+@dataclass
+class EncodedPayload:
+    """
+    A serialized JSON body together with its validator and precompressed variants.
+
+    Used for static datasets (e.g. districts) so compression happens once at startup.
+    """
+    body: bytes
+    etag: str
+    gzip: bytes | None = None
+    br: bytes | None = None
+
+
+def encode_json(content) -> bytes:
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def make_etag(*parts) -> str:
+    """
+    Builds a weak ETag from dataset/scenario version parts (any JSON-serializable values).
+
+    Weak, because the identity, gzip and br bodies served under it are only
+    semantically equivalent, not byte-identical.
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return 'W/"' + hashlib.sha1(raw).hexdigest() + '"'
+
+
+def data_version(*frames: pd.DataFrame | None) -> str:
+    """
+    Content hash over one or more DataFrames, used as dataset version in ETags.
+    """
+    h = hashlib.sha1()
+    for df in frames:
+        if df is None or df.empty:
+            h.update(b"empty")
+            continue
+        h.update(",".join(map(str, df.columns)).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def precompress(body: bytes, etag: str | None = None, fast: bool = False) -> EncodedPayload:
+    """
+    Wraps a body with an ETag (content hash unless given) and compressed variants.
+
+    Static payloads use the high (slow) compression levels once at startup. With
+    fast=True (per-request results) only a quick gzip variant is built; brotli's
+    higher qualities are too slow to run per request.
+    """
+    if etag is None:
+        # Weak: shared by the identity and compressed variants (see make_etag)
+        etag = 'W/"' + hashlib.sha1(body).hexdigest() + '"'
+
+    payload = EncodedPayload(body=body, etag=etag)
+    if len(body) >= COMPRESS_MIN_BYTES:
+        payload.gzip = gzip.compress(body, compresslevel=1 if fast else GZIP_LEVEL)
+        if brotli is not None and not fast:
+            payload.br = brotli.compress(body, quality=BROTLI_QUALITY)
+    return payload
+
+
+def _accepted_encodings(request: Request) -> set[str]:
+    """
+    Parses Accept-Encoding into the acceptable codings among br, gzip and identity.
+
+    "*" applies to codings not listed explicitly (RFC 9110, section 12.5.3);
+    identity is acceptable unless excluded via identity;q=0 or *;q=0.
+    """
+    qvalues = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        token, _, params = item.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 1.0
+        qvalues[token] = q
+
+    wildcard = qvalues.get("*")
+    accepted = set()
+    for coding in ("br", "gzip", "identity"):
+        q = qvalues.get(coding, wildcard)
+        if q is None:
+            q = 1.0 if coding == "identity" else 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """
+    Weak comparison of If-None-Match against the current ETag (RFC 9110).
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == current for tag in header.split(","))
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """
+    Returns a 304 response if the client already holds the representation, else None.
+
+    Callers check this before doing any work, so revalidation is cheap. For methods
+    other than GET/HEAD (e.g. POST /api/cityscope) a matching If-None-Match is a
+    failed precondition and answered with 412 (RFC 9110, section 13.1.2); clients
+    then keep using the result they already hold.
+    """
+    if not _etag_matches(request, etag):
+        return None
+    status = 304 if request.method in ("GET", "HEAD") else 412
+    return Response(status_code=status, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+
+def payload_response(request: Request, payload: EncodedPayload) -> Response:
+    """
+    Serves an EncodedPayload with conditional-request and content-negotiation support.
+    """
+    cached = not_modified(request, payload.etag)
+    if cached is not None:
+        return cached
+
+    headers = {"ETag": payload.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    accepted = _accepted_encodings(request)
+
+    if payload.br is not None and "br" in accepted:
+        headers["Content-Encoding"] = "br"
+        return Response(content=payload.br, media_type="application/json", headers=headers)
+    if payload.gzip is not None and "gzip" in accepted:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=payload.gzip, media_type="application/json", headers=headers)
+    if "identity" not in accepted and "gzip" in accepted:
+        # Small bodies have no precompressed variant; gzip them when identity is refused
+        headers["Content-Encoding"] = "gzip"
+        body = gzip.compress(payload.body, compresslevel=1)
+        return Response(content=body, media_type="application/json", headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
@@ -0,0 +1,191 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+import shapely
+
+from core.config import MEMORY_SAMPLE_INTERVAL
+from core.http_cache import EncodedPayload
+
+try:
+    import psutil
+except ImportError:  # optional: fall back to /proc
+    psutil = None
+
+MB = 1024 * 1024
+
+# Rough per-row costs used to estimate cityscope request memory (bytes)
+MATRIX_ROW_BYTES = 160  # from_id/to_id objects + travel_time + merge/groupby overhead
+FEATURE_BASE_BYTES = 1200  # polygon coordinates + properties dict of one feature
+FEATURE_CATEGORY_BYTES = 120  # one tt_/n_ property
+
+
+def footprint(obj) -> int:
+    """
+    Approximate in-memory size of an AppState member in bytes.
+
+    DataFrames are measured deeply (object columns included), plus 16 bytes per
+    coordinate of geometry columns, which pandas only counts as pointers;
+    containers are summed.
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, pd.DataFrame):
+        size = int(obj.memory_usage(deep=True, index=True).sum())
+        for _, col in obj.items():
+            if col.dtype.name == "geometry":
+                size += int(shapely.get_num_coordinates(col.values).sum()) * 16
+        return size
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, EncodedPayload):
+        return sum(len(b) for b in (obj.body, obj.gzip, obj.br) if b is not None)
+    if isinstance(obj, dict):
+        return sum(footprint(v) for v in obj.values())
+    return sys.getsizeof(obj)
+
+
+def jvm_heap_bytes() -> int | None:
+    """
+    Used heap of the JVM hosting R5 (r5py/JPype), or None if no JVM is running.
+    """
+    try:
+        import jpype
+
+        if not jpype.isJVMStarted():
+            return None
+        runtime = jpype.JClass("java.lang.Runtime").getRuntime()
+        return int(runtime.totalMemory() - runtime.freeMemory())
+    except Exception:
+        return None
+
+
+def process_rss() -> int | None:
+    """
+    Current resident set size of this process (bytes), or None if unavailable.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def state_footprint(st) -> dict:
+    """
+    Per-component memory footprint (MB) of the shared AppState.
+    """
+    components = {
+        "df_grid": footprint(st.df_grid),
+        "districts_gdf": footprint(st.districts_gdf),
+        "district_payloads": footprint(st.district_payloads),
+        "poi_cache": footprint(st.poi_cache),
+    }
+    per_category = {cat: round(footprint(df) / MB, 2) for cat, df in st.poi_cache.items()}
+
+    jvm = jvm_heap_bytes()
+    return {
+        "components_mb": {k: round(v / MB, 2) for k, v in components.items()},
+        "poi_cache_mb": per_category,
+        "network_jvm_heap_mb": round(jvm / MB, 2) if jvm is not None else None,
+    }
+
+
+def estimate_cityscope_bytes(n_cells: int, n_pois: int, n_categories: int, chunk_size: int) -> int:
+    """
+    Upper estimate of the extra memory one cityscope request needs.
+
+    The raw matrix is bounded by the origin chunk (chunk_size x POIs); the response
+    holds one feature per cell plus its serialized form.
+    """
+    matrix = min(n_cells, chunk_size) * n_pois * MATRIX_ROW_BYTES
+    features = n_cells * (FEATURE_BASE_BYTES + n_categories * FEATURE_CATEGORY_BYTES)
+    return matrix + 2 * features
+
+
+class MemoryReservations:
+    """
+    Estimated bytes reserved by requests that are currently computing.
+
+    RSS only shows what running requests have allocated so far; reserving their
+    estimate up front keeps concurrent admissions from overcommitting the budget.
+    Reservations are taken in the threadpool, hence the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reserved = 0
+
+    def try_reserve(self, nbytes: int, available: int) -> bool:
+        """
+        Reserves `nbytes` if they fit into `available` minus current reservations.
+        """
+        with self._lock:
+            if self.reserved + nbytes > available:
+                return False
+            self.reserved += nbytes
+            return True
+
+    def release(self, nbytes: int):
+        with self._lock:
+            self.reserved -= nbytes
+
+
+class PeakSampler:
+    """
+    Samples process RSS in a background thread while a request runs.
+
+    RSS is process-wide, so concurrent requests are attributed to each other;
+    the numbers are meant for spotting heavy endpoints, not exact accounting.
+    """
+
+    def __init__(self, interval: float = MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_rss = None
+        self.peak_rss = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = process_rss()
+            if rss is not None and rss > self.peak_rss:
+                self.peak_rss = rss
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = process_rss()
+        if self.start_rss is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            rss = process_rss()
+            if rss is not None and rss > self.peak_rss:
+                self.peak_rss = rss
+        return False
+
+    @property
+    def peak_delta(self) -> int | None:
+        if self.start_rss is None:
+            return None
+        return max(0, self.peak_rss - self.start_rss)
+
+
+def record_request(stats: dict, path: str, sampler: PeakSampler):
+    """
+    Aggregates a finished request's peak allocation into AppState.memory_stats.
+    """
+    delta = sampler.peak_delta
+    if delta is None:
+        return
+    entry = stats.setdefault(path, {"requests": 0, "max_peak_mb": 0.0, "last_peak_mb": 0.0})
+    entry["requests"] += 1
+    entry["last_peak_mb"] = round(delta / MB, 2)
+    entry["max_peak_mb"] = max(entry["max_peak_mb"], entry["last_peak_mb"])
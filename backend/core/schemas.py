@@ -1,11 +1,13 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Literal
 
 class IsochroneRequest(BaseModel):
     lat: float
     lon: float
     mode: str
-    threshold: int
+    threshold: Optional[int] = None
+    thresholds: Optional[List[int]] = None
+    outline: Literal["convex", "concave"] = "convex"
 
 class PoisRequest(BaseModel):
     bbox: list[float]         
@@ -24,3 +26,6 @@ class CityScopeRequest(BaseModel):
     currentMinutes: int
     user_pois: Optional[List[UserPoi]] = None
     removed_poi_ids: Optional[List[int]] = None
+    count_thresholds: Optional[List[int]] = None
+    skip_unpopulated: bool = False
+    resolution: int = 100
@@ -0,0 +1,41 @@
+import asyncio
+
+from starlette.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight computations.
+
+    The first caller for a key starts `fn` in the threadpool; callers arriving with
+    the same key while it runs await the same task and share its result (or error).
+    The key is dropped once the task finishes, so later requests recompute.
+
+    The shared task is shielded: a disconnecting client does not cancel the
+    computation other callers are waiting for.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn, *args):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            self._inflight[key] = task
+            self.started += 1
+
+            def _done(t: asyncio.Task):
+                if self._inflight.get(key) is t:
+                    del self._inflight[key]
+                # Mark the exception as retrieved even if every caller went away
+                if not t.cancelled():
+                    t.exception()
+
+            task.add_done_callback(_done)
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task)
@@ -3,6 +3,10 @@ from typing import Optional
 import pandas as pd
 from r5py import TransportNetwork
 
+from core.http_cache import EncodedPayload
+from core.memory import MemoryReservations
+from core.singleflight import SingleFlight
+
 @dataclass
 class AppState:
     network_status: str = "not ready"
@@ -10,3 +14,13 @@ class AppState:
     poi_cache: dict[str, pd.DataFrame] = field(default_factory=dict)
     df_grid: Optional[pd.DataFrame] = None
     districts_gdf = None
+    district_payloads: dict[float, EncodedPayload] = field(default_factory=dict)
+    # Content hashes of the loaded datasets, used to derive ETags
+    grid_version: str = ""
+    poi_version: str = ""
+    # Per-endpoint peak RSS deltas sampled by the memory middleware
+    memory_stats: dict[str, dict] = field(default_factory=dict)
+    # Estimated memory of cityscope requests currently routing
+    memory_reservations: MemoryReservations = field(default_factory=MemoryReservations)
+    # Coalesces identical in-flight grid/cityscope computations
+    singleflight: SingleFlight = field(default_factory=SingleFlight)
@@ -1,15 +1,34 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from core.schemas import CityScopeRequest
-from core.config import CATS, HALF, WALK_SPEED, CYCLE_SPEED
+from core.config import (
+    CATS,
+    HALF,
+    CELL_SIZE,
+    WALK_SPEED,
+    CYCLE_SPEED,
+    CITYSCOPE_RESOLUTIONS,
+    PROGRESSIVE_COARSE_SIZES,
+    PROGRESSIVE_MAX_COARSE_CELLS,
+    PROGRESSIVE_BATCH_CELLS,
+    ROUTING_ORIGIN_CHUNK,
+    ROUTING_MAX_TIME,
+    MEMORY_BUDGET_MB,
+)
 
-import datetime
 import math
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import box
-from r5py import TransportMode, TravelTimeMatrix
 
-from services.zensus import to_wgs84, to_laea, cell_polygon_wgs84
+from services.zensus import to_wgs84, to_laea, cell_polygon_wgs84, aggregate_grid
+from services.routing import (
+    pruned_travel_times,
+    pivot_travel_times,
+)
+from core.http_cache import make_etag, not_modified, payload_response, precompress, encode_json
+from core.memory import MB, process_rss, estimate_cityscope_bytes
 
 router = APIRouter(prefix="/api", tags=["cityscope"])
 
@@ -20,33 +39,277 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
     Computes per-cell travel times to the nearest POI per category inside a user-defined ROI.
 
     Workflow (high level):
-    - Select census grid cells inside the ROI (bbox) in a metric CRS (EPSG:3035).
+    - Select census grid cells inside the ROI (bbox) in a metric CRS (EPSG:3035),
+      optionally dropping unpopulated cells (`skip_unpopulated`).
     - Collect candidate POIs for the selected categories (cache + optional user POIs),
       optionally removing POIs for the "removal scenario".
     - Apply a buffered ROI prefilter in EPSG:3035 to limit POIs before routing.
-    - Build an R5 TravelTimeMatrix from cell centroids (origins) to POIs (destinations).
-    - Aggregate to minimum travel time per (cell, category) and return as GeoJSON features.
+    - Prune POIs that cannot be the nearest for any cell (Euclidean lower bound, KD-tree).
+    - Build R5 TravelTimeMatrix chunks from cell centroids (origins) to POIs (destinations),
+      reducing each chunk to the minimum travel time per (cell, category) right away.
+    - Return the per-cell results as GeoJSON features.
 
     Returned feature properties include:
     - id, pop, district_id
     - tt_<category> (minutes) for each available category
+    - n_<category>_<minutes>: number of POIs reachable within each of the optional
+      `count_thresholds` (cumulative opportunities, derived from the same matrix)
+
+    With `resolution` > 100 (e.g. 500 or 1000), cells are aggregated to blocks of that
+    size (population summed) before routing; see /api/cityscope/stream for the
+    progressive coarse-to-fine variant.
+
+    The response ETag is derived from the grid/POI dataset versions and the full
+    scenario (request body). As this is a POST, a request whose If-None-Match still
+    matches is answered with 412 instead of 304; the frontend then reuses the result
+    it already holds.
+    Identical requests arriving while one is computing wait for and share its result.
     """
     st = request.app.state.app_state
     if st.network_status != "ready":
         raise HTTPException(status_code=500, detail="Transport network not yet ready")
 
-    network = st.network
-    df_grid = st.df_grid
-    poi_cache = st.poi_cache
+    if req.resolution not in CITYSCOPE_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {CITYSCOPE_RESOLUTIONS}")
+    bounds = _parse_bbox(req.bbox)
 
-    # Categories: currently uses all configured categories (frontend can restrict on demand)
-    cats = list(CATS)
+    etag = make_etag("cityscope", st.grid_version, st.poi_version, _normalized_params(req, bounds))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    # Identical concurrent analyses share one routing run (executed in the threadpool)
+    payload = await st.singleflight.do(etag, _cityscope_payload, req, st, bounds, etag)
+    return payload_response(request, payload)
+
+
+def _normalized_params(req: CityScopeRequest, bounds) -> dict:
+    """
+    Request parameters in canonical form, so equivalent requests share ETag and
+    in-flight computation regardless of list order or number formatting.
+    """
+    params = req.model_dump()
+    params["bbox"] = [float(v) for v in bounds]
+    params["mode"] = req.mode.lower()
+    params["categories"] = sorted(c.lower() for c in req.categories)
+    params["removed_poi_ids"] = sorted(set(req.removed_poi_ids or []))
+    params["count_thresholds"] = _count_thresholds(req)
+    return params
+
+
+def _count_thresholds(req: CityScopeRequest) -> list[int]:
+    """
+    Sorted, de-duplicated positive `count_thresholds`.
+
+    Travel times are only routed up to ROUTING_MAX_TIME, so larger thresholds
+    are rejected (400) instead of silently counting too few POIs.
+    """
+    thresholds = sorted({int(t) for t in (req.count_thresholds or []) if t > 0})
+    if thresholds and thresholds[-1] > ROUTING_MAX_TIME:
+        raise HTTPException(
+            status_code=400,
+            detail=f"count_thresholds must not exceed {ROUTING_MAX_TIME} minutes",
+        )
+    return thresholds
+
+
+def _cityscope_payload(req: CityScopeRequest, st, bounds, etag: str):
+    """
+    Computes and encodes the cityscope response body once for all coalesced callers.
+    """
+    fc = _cityscope_feature_collection(req, st, bounds)
+    if "resolution" in fc:
+        # Downgraded under memory pressure: must not validate the full-resolution result
+        etag = make_etag(etag, fc["resolution"])
+
+    return precompress(encode_json(fc), etag, fast=True)
+
+
+@router.post("/cityscope/stream")
+def api_cityscope_stream(req: CityScopeRequest, request: Request):
+    """
+    Progressive variant of /api/cityscope, streamed as NDJSON (one JSON object per line).
+
+    1. {"stage": "coarse", "resolution": <m>, "type": "FeatureCollection", ...}:
+       the ROI aggregated to coarse blocks (population summed), routed first. The block
+       size grows with the ROI so this stage takes roughly constant time.
+    2. {"stage": "fine", "resolution": 100, "type": "FeatureCollection", ...}: batches
+       of 100m cells at full resolution, ordered from the ROI centre outwards.
+    3. {"stage": "done"}
+
+    Feature properties match /api/cityscope; `resolution` in the request is ignored.
+    Backend-only for now: the frontend still calls /api/cityscope.
+    """
+    st = request.app.state.app_state
+    if st.network_status != "ready":
+        raise HTTPException(status_code=500, detail="Transport network not yet ready")
 
-    # Parse bbox string in WGS84 map order: minLon,minLat,maxLon,maxLat
+    # Validate and reserve before the response starts; errors cannot be reported mid-stream
+    bounds = _parse_bbox(req.bbox)
+    _count_thresholds(req)
+
+    cells = _roi_cells(req, st.df_grid, bounds)
+    pois = _routing_pois(req, st.poi_cache, bounds) if not cells.empty else None
+    reserved = _reserve_stream_memory(cells, pois, st.memory_reservations) if pois is not None else 0
+
+    return StreamingResponse(
+        _progressive_cityscope(req, st, cells, pois, reserved),
+        media_type="application/x-ndjson",
+    )
+
+
+def _reserve_stream_memory(cells, pois, reservations) -> int:
+    """
+    Reserves the estimate of the largest stream stage (coarse blocks or one fine batch);
+    raises 503 if it does not fit. Stages run one after another, so one stage's
+    estimate covers the whole stream. No-op without a budget.
+
+    Returns:
+        reserved bytes to release once the stream ends
+    """
+    rss = process_rss()
+    if MEMORY_BUDGET_MB is None or rss is None:
+        return 0
+
+    pois_df = pois[1]
+    n_cells = min(len(cells), max(PROGRESSIVE_MAX_COARSE_CELLS, PROGRESSIVE_BATCH_CELLS))
+    needed = estimate_cityscope_bytes(n_cells, len(pois_df), pois_df["category"].nunique(), ROUTING_ORIGIN_CHUNK)
+    if not reservations.try_reserve(needed, MEMORY_BUDGET_MB * MB - rss):
+        raise HTTPException(status_code=503, detail="Server memory budget exhausted, retry later")
+    return needed
+
+
+def _parse_bbox(bbox: str) -> tuple[float, float, float, float]:
+    """
+    Parses the bbox string in WGS84 map order: minLon,minLat,maxLon,maxLat.
+    """
     try:
-        minLon, minLat, maxLon, maxLat = map(float, req.bbox.split(","))
+        minLon, minLat, maxLon, maxLat = map(float, bbox.split(","))
     except Exception:
-        raise HTTPException(status_code=400, detail=f"Invalid bbox format: {req.bbox!r}")
+        raise HTTPException(status_code=400, detail=f"Invalid bbox format: {bbox!r}")
+    return minLon, minLat, maxLon, maxLat
+
+
+def _cityscope_feature_collection(req: CityScopeRequest, st, bounds) -> dict:
+    """
+    Runs the cityscope pipeline for one request and returns the GeoJSON FeatureCollection.
+
+    With req.resolution above the census cell size, cells are aggregated to blocks first.
+    If the memory budget forces a coarser resolution, the FeatureCollection carries
+    `resolution` and `requested_resolution` members.
+    """
+    cells = _roi_cells(req, st.df_grid, bounds)
+    if cells.empty:
+        return {"type": "FeatureCollection", "features": []}
+
+    pois = _routing_pois(req, st.poi_cache, bounds)
+    if pois is None:
+        return {"type": "FeatureCollection", "features": []}
+
+    resolution, reserved = _fit_memory_budget(req.resolution, cells, pois, st.memory_reservations)
+    try:
+        if resolution > CELL_SIZE:
+            cells = aggregate_grid(cells, resolution)
+
+        features = _route_cells(req, st.network, cells, pois, resolution / 2.0)
+    finally:
+        st.memory_reservations.release(reserved)
+
+    fc = {"type": "FeatureCollection", "features": features}
+    if resolution != req.resolution:
+        fc["resolution"] = resolution
+        fc["requested_resolution"] = req.resolution
+    return fc
+
+
+def _fit_memory_budget(resolution: int, cells, pois, reservations) -> tuple[int, int]:
+    """
+    Picks the finest resolution (>= the requested one) whose estimated memory fits
+    into the remaining budget and reserves that estimate; raises 503 if none fits.
+
+    The remaining budget is the budget minus current RSS minus the reservations of
+    requests still routing. No-op without a budget.
+
+    Returns:
+        (resolution, reserved bytes to release once routing is done)
+    """
+    rss = process_rss()
+    if MEMORY_BUDGET_MB is None or rss is None:
+        return resolution, 0
+
+    available = MEMORY_BUDGET_MB * MB - rss
+    pois_df = pois[1]
+    n_categories = pois_df["category"].nunique()
+
+    for candidate in CITYSCOPE_RESOLUTIONS:
+        if candidate < resolution:
+            continue
+        n_cells = math.ceil(len(cells) / (candidate / CELL_SIZE) ** 2)
+        needed = estimate_cityscope_bytes(n_cells, len(pois_df), n_categories, ROUTING_ORIGIN_CHUNK)
+        if reservations.try_reserve(needed, available):
+            return candidate, needed
+
+    raise HTTPException(status_code=503, detail="Analysis exceeds the server memory budget, choose a smaller area")
+
+
+def _progressive_cityscope(req: CityScopeRequest, st, cells, pois, reserved: int):
+    """
+    Yields the NDJSON lines of /api/cityscope/stream (coarse stage, fine batches, done)
+    and releases the stream's memory reservation when it ends.
+
+    Runs as a sync generator, so Starlette iterates it in the threadpool.
+    """
+    def line(obj) -> bytes:
+        return encode_json(obj) + b"\n"
+
+    try:
+        if pois is None:
+            yield line({"stage": "done"})
+            return
+        yield from _stream_stages(req, st, cells, pois, line)
+    finally:
+        st.memory_reservations.release(reserved)
+
+
+def _stream_stages(req: CityScopeRequest, st, cells, pois, line):
+    """
+    Yields the coarse stage and the fine batches of /api/cityscope/stream.
+    """
+    # Coarse stage: smallest block size that keeps the block count bounded
+    for size in PROGRESSIVE_COARSE_SIZES:
+        coarse = aggregate_grid(cells, size)
+        if len(coarse) <= PROGRESSIVE_MAX_COARSE_CELLS:
+            break
+
+    yield line({
+        "stage": "coarse",
+        "resolution": size,
+        "type": "FeatureCollection",
+        "features": _route_cells(req, st.network, coarse, pois, size / 2.0),
+    })
+
+    # Fine stage: full-resolution batches, ROI centre first
+    cx = cells["x_mp_100m"].mean()
+    cy = cells["y_mp_100m"].mean()
+    order = np.argsort(np.hypot(cells["x_mp_100m"] - cx, cells["y_mp_100m"] - cy).to_numpy(), kind="stable")
+
+    for start in range(0, len(order), PROGRESSIVE_BATCH_CELLS):
+        batch = cells.iloc[order[start:start + PROGRESSIVE_BATCH_CELLS]]
+        yield line({
+            "stage": "fine",
+            "resolution": int(CELL_SIZE),
+            "type": "FeatureCollection",
+            "features": _route_cells(req, st.network, batch, pois, HALF),
+        })
+
+    yield line({"stage": "done"})
+
+
+def _roi_cells(req: CityScopeRequest, df_grid, bounds):
+    """
+    Selects the census grid cells intersecting the ROI (optionally populated cells only).
+    """
+    minLon, minLat, maxLon, maxLat = bounds
 
     # Convert bbox to EPSG:3035 (LAEA) to filter 100m grid cells in meters
     ll = to_laea.transform(minLon, minLat)
@@ -67,8 +330,24 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
         & (df_grid["y_mp_100m"] <= maxY + HALF)
     ]
 
-    if cells.empty:
-        return {"type": "FeatureCollection", "features": []}
+    # Unpopulated cells carry no weight in the population-based indicators
+    if req.skip_unpopulated:
+        cells = cells[cells["Bevoelkerungszahl"].fillna(0) > 0]
+
+    return cells
+
+
+def _routing_pois(req: CityScopeRequest, poi_cache, bounds):
+    """
+    Collects the scenario POIs (cache + user additions - removals) near the ROI.
+
+    Returns:
+        (pois_gdf in EPSG:4326, pois_df, POI coordinates in EPSG:3035) or None if empty.
+    """
+    minLon, minLat, maxLon, maxLat = bounds
+
+    # Categories: currently uses all configured categories (frontend can restrict on demand)
+    cats = list(CATS)
 
     # Collect POIs for all selected categories from the in-memory cache
     pois_dfs: list[pd.DataFrame] = []
@@ -82,7 +361,7 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
             pois_dfs.append(sub)
 
     if not pois_dfs:
-        return {"type": "FeatureCollection", "features": []}
+        return None
 
     pois_df = pd.concat(pois_dfs, ignore_index=True)
 
@@ -103,15 +382,17 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
         pois_df = pd.concat([pois_df, df_user], ignore_index=True)
 
     # Remove POIs by id (scenario removal)
-    removed = set(req.removed_poi_ids)
+    removed = set(req.removed_poi_ids or [])
     if removed:
         pois_df = pois_df[~pois_df["id"].isin(removed)]
 
     if pois_df.empty:
-        return {"type": "FeatureCollection", "features": []}
+        return None
 
-    # Prefilter POIs with a buffered ROI in meters (EPSG:3035) to reduce routing load
-    minutes = int(req.currentMinutes)
+    # Prefilter POIs with a buffered ROI in meters (EPSG:3035) to reduce routing load.
+    # The buffer must also cover the largest count threshold, or POIs reachable within
+    # it but outside the currentMinutes buffer would be missing from the counts.
+    minutes = max([int(req.currentMinutes), *_count_thresholds(req)])
 
     if req.mode.lower() == "walk":
         speed_kmh = 5
@@ -133,11 +414,23 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
     pois_gdf_3035 = pois_gdf_3035[pois_gdf_3035.intersects(roi_buf_3035)]
 
     if pois_gdf_3035.empty:
-        return {"type": "FeatureCollection", "features": []}
+        return None
 
     # Convert back to WGS84 for R5 routing inputs
     pois_gdf = pois_gdf_3035.to_crs("EPSG:4326")
     pois_df = pd.DataFrame(pois_gdf.drop(columns="geometry"))
+    pois_xy = np.column_stack([pois_gdf_3035.geometry.x, pois_gdf_3035.geometry.y])
+
+    return pois_gdf, pois_df, pois_xy
+
+
+def _route_cells(req: CityScopeRequest, network, cells, pois, half: float) -> list[dict]:
+    """
+    Routes the given cells to the scenario POIs and builds their GeoJSON features.
+
+    `half` is half the cell edge length in meters (50 for census cells, more for blocks).
+    """
+    pois_gdf, pois_df, pois_xy = pois
 
     # Build origins from cell centroids (EPSG:3035 -> EPSG:4326)
     xs_cells = cells["x_mp_100m"].to_numpy(dtype=float)
@@ -150,44 +443,32 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
         crs="EPSG:4326",
     )
 
+    origins_xy = np.column_stack([xs_cells, ys_cells])
+
     # Configure mode and speeds for R5 (walking mode; speed overridden per scenario)
     speed_kwargs = {"speed_walking": WALK_SPEED} if req.mode.lower() == "walk" else {"speed_walking": CYCLE_SPEED}
 
+    count_thresholds = _count_thresholds(req)
 
-    travel_time_matrix = TravelTimeMatrix(
+    # Minimum travel time (and optional reachable-POI counts) per (origin cell, category).
+    # Destinations are pruned by a Euclidean lower bound, and origins are routed in
+    # chunks so the raw matrix never exceeds chunk size x POIs.
+    tt_min_cat = pruned_travel_times(
         network,
-        origins=origins_gdf,
-        destinations=pois_gdf,
-        transport_modes=[TransportMode.WALK],
-        departure=datetime.datetime(2026, 1, 1, 8, 0),
-        **speed_kwargs,
-    )
-
-    # Attach POI categories to matrix rows to enable per-category aggregation
-    tt_with_cat = travel_time_matrix.merge(
-        pois_df[["id", "category"]],
-        left_on="to_id",
-        right_on="id",
-        how="left",
-    )
-
-    # Minimum travel time per (origin cell, category)
-    tt_min_cat = (
-        tt_with_cat.groupby(["from_id", "category"])["travel_time"].min().reset_index()
+        origins_gdf,
+        origins_xy,
+        pois_gdf,
+        pois_xy,
+        pois_df,
+        speed_kwargs,
+        count_thresholds=count_thresholds,
     )
 
     if tt_min_cat.empty:
-        return {"type": "FeatureCollection", "features": []}
+        return []
 
-    # Pivot to wide format: tt_<category> columns per origin cell id
-    wide = tt_min_cat.pivot(
-        index="from_id",
-        columns="category",
-        values="travel_time",
-    ).reset_index()
-
-    rename_map = {cat: f"tt_{cat}" for cat in tt_min_cat["category"].unique()}
-    wide = wide.rename(columns=rename_map)
+    # Pivot to wide format: tt_<category> (and n_<category>_<minutes>) columns per origin cell id
+    wide = pivot_travel_times(tt_min_cat, count_thresholds)
 
     # Join travel time columns back to the grid cell table
     cells = cells.merge(
@@ -197,7 +478,13 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
         how="left",
     )
 
-    # Build GeoJSON response with 100m cell polygons and travel time attributes
+    # Routed cells without any reachable POI of a category count zero opportunities;
+    # cells without any routed row (e.g. not on the network) keep None like tt_*
+    n_cols = [c for c in cells.columns if c.startswith("n_")]
+    routed = cells["from_id"].notna()
+    cells.loc[routed, n_cols] = cells.loc[routed, n_cols].fillna(0)
+
+    # Build GeoJSON features with cell polygons and travel time attributes
     features = []
     tt_cols = [c for c in cells.columns if c.startswith("tt_")]
 
@@ -205,7 +492,7 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
         x = float(r["x_mp_100m"])
         y = float(r["y_mp_100m"])
 
-        geom = cell_polygon_wgs84(x, y)
+        geom = cell_polygon_wgs84(x, y, half)
 
         props: dict = {
             "id": r["GITTER_ID_100m"],
@@ -224,6 +511,9 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
                 except Exception:
                     props[col] = None
 
+        for col in n_cols:
+            props[col] = int(r[col]) if pd.notna(r[col]) else None
+
         features.append(
             {
                 "type": "Feature",
@@ -232,4 +522,4 @@ async def api_cityscope(req: CityScopeRequest, request: Request):
             }
         )
 
-    return {"type": "FeatureCollection", "features": features}
+    return features
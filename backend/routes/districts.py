@@ -1,9 +1,23 @@
-from fastapi import APIRouter, Request
-from services.districts import districts_to_geojson
+from fastapi import APIRouter, Query, Request
+from core.http_cache import payload_response
+from services.districts import select_district_level
 
 router = APIRouter(prefix="/api", tags=["districts"])
 
 @router.get("/districts")
-def api_districts(request: Request):
-    districts_gdf = request.app.state.app_state.districts_gdf
-    return districts_to_geojson(districts_gdf)
+def api_districts(
+    request: Request,
+    zoom: float | None = Query(None, ge=0, le=24),
+    tolerance: float | None = Query(None, ge=0),
+):
+    """
+    Returns district polygons as pre-serialized GeoJSON.
+
+    The payloads are built once at startup in several simplification levels;
+    `zoom` (map zoom) or `tolerance` (meters) selects the level, otherwise the
+    full-resolution geometry is returned. Responses carry a content-hash ETag
+    and are served gzip/brotli-compressed when the client accepts it.
+    """
+    payloads = request.app.state.app_state.district_payloads
+    level = select_district_level(payloads.keys(), zoom=zoom, tolerance=tolerance)
+    return payload_response(request, payloads[level])
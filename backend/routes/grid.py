@@ -1,16 +1,30 @@
 from fastapi import APIRouter, Query, Request
 from services.zensus import filter_grid_by_bbox, cell_polygon_wgs84
+from core.http_cache import make_etag, not_modified, payload_response, precompress, encode_json
 import pandas as pd
 
 router = APIRouter(prefix="/api", tags=["grid"])
 
 @router.get("/grid")
-def api_grid(
+async def api_grid(
     request: Request,
     bbox: str | None = Query(None),
     limit: int = Query(20000, ge=1, le=200000),
 ):
-    df_grid = request.app.state.app_state.df_grid
+    st = request.app.state.app_state
+
+    # The payload depends only on the grid dataset and the query parameters
+    etag = make_etag("grid", st.grid_version, bbox, limit)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    # Identical concurrent requests share one computation (run in the threadpool)
+    payload = await st.singleflight.do(etag, _grid_payload, st.df_grid, bbox, limit, etag)
+    return payload_response(request, payload)
+
+
+def _grid_payload(df_grid, bbox: str | None, limit: int, etag: str):
     data = filter_grid_by_bbox(df_grid, bbox, limit)
 
     features = []
@@ -25,4 +39,5 @@ def api_grid(
             "geometry": geom,
         })
 
-    return {"type": "FeatureCollection", "features": features}
+    fc = {"type": "FeatureCollection", "features": features}
+    return precompress(encode_json(fc), etag, fast=True)
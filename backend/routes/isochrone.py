@@ -6,16 +6,30 @@ router = APIRouter(prefix="/api", tags=["isochrone"])
 
 @router.post("/isochrone")
 def returnIsochrones(req: IsochroneRequest, request: Request):
+    """
+    Returns isochrones for one origin.
+
+    - thresholds: list of minutes -> FeatureCollection with one nested ring per
+      threshold, all from a single routing pass
+    - threshold: single value -> one Feature (original response format)
+    """
     st = request.app.state.app_state
     if st.network_status != "ready":
         raise HTTPException(status_code=500, detail="Transport network not yet ready")
 
+    thresholds = req.thresholds or ([req.threshold] if req.threshold is not None else [])
+    if not thresholds or any(t <= 0 for t in thresholds):
+        raise HTTPException(status_code=400, detail="Provide positive threshold or thresholds")
 
-
-    return calculate_isochrones(
+    fc = calculate_isochrones(
         network=st.network,
         lat=req.lat,
         lon=req.lon,
         mode=req.mode,
-        threshold=req.threshold,
+        thresholds=thresholds,
+        outline=req.outline,
     )
+
+    if req.thresholds:
+        return fc
+    return fc["features"][0]
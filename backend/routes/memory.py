@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Request
+from core.config import MEMORY_BUDGET_MB
+from core.memory import MB, process_rss, state_footprint
+
+router = APIRouter(prefix="/api", tags=["memory"])
+
+@router.get("/memory")
+def api_memory(request: Request):
+    """
+    Reports memory usage: process RSS, configured budget, memory reserved by running
+    cityscope requests, per-component footprint of the shared AppState and sampled
+    per-endpoint request peaks.
+    """
+    st = request.app.state.app_state
+    rss = process_rss()
+
+    return {
+        "process_rss_mb": round(rss / MB, 2) if rss is not None else None,
+        "budget_mb": MEMORY_BUDGET_MB,
+        "reserved_mb": round(st.memory_reservations.reserved / MB, 2),
+        "state": state_footprint(st),
+        "requests": st.memory_stats,
+    }
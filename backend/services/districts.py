@@ -1,6 +1,8 @@
 import geopandas as gpd
+import shapely
 from shapely.geometry import mapping
-from core.config import DISTRICTS_SHP, DISTRICT_ID_COL
+from core.config import DISTRICTS_SHP, DISTRICT_ID_COL, DISTRICT_SIMPLIFY_LEVELS
+from core.http_cache import EncodedPayload, encode_json, precompress
 
 def load_districts_gdf():
     districts_gdf = gpd.read_file(DISTRICTS_SHP)
@@ -26,3 +28,69 @@ def districts_to_geojson(districts_gdf):
         })
 
     return {"type": "FeatureCollection", "features": features}
+
+
+def simplify_districts(districts_gdf, tolerance_m: float):
+    """
+    Returns a copy of the district geometries simplified in EPSG:3035 (meters).
+
+    Districts form a coverage (shared borders), so the coverage-aware simplifier
+    is preferred: it simplifies each shared edge once and keeps neighbouring
+    polygons gap- and overlap-free. It does not reject invalid coverages (e.g.
+    slightly overlapping source polygons) but distorts them, so the coverage is
+    validated first. Invalid coverages and older shapely/GEOS builds fall back to
+    per-polygon topology-preserving simplification.
+    """
+    if tolerance_m <= 0:
+        return districts_gdf
+
+    gdf_3035 = districts_gdf.to_crs(epsg=3035)
+    geoms = gdf_3035.geometry.values
+
+    if hasattr(shapely, "coverage_simplify") and shapely.coverage_is_valid(geoms):
+        simplified = shapely.coverage_simplify(geoms, tolerance_m)
+    else:
+        if hasattr(shapely, "coverage_simplify"):
+            print("District coverage is invalid (gaps/overlaps); simplifying per polygon")
+        simplified = shapely.simplify(geoms, tolerance_m, preserve_topology=True)
+
+    gdf_3035 = gdf_3035.set_geometry(gpd.GeoSeries(simplified, index=gdf_3035.index, crs=gdf_3035.crs))
+    return gdf_3035.to_crs(epsg=4326)
+
+
+def build_district_payloads(districts_gdf) -> dict[float, EncodedPayload]:
+    """
+    Serializes (and precompresses) the district GeoJSON once per simplification level.
+
+    Returns:
+        Mapping tolerance (meters, 0 = full resolution) -> EncodedPayload.
+        The bytes are kept in AppState so /api/districts does no per-request work.
+    """
+    payloads: dict[float, EncodedPayload] = {}
+    for tolerance_m in DISTRICT_SIMPLIFY_LEVELS:
+        fc = districts_to_geojson(simplify_districts(districts_gdf, tolerance_m))
+        payloads[float(tolerance_m)] = precompress(encode_json(fc))
+    return payloads
+
+
+def select_district_level(levels, zoom: float | None = None, tolerance: float | None = None) -> float:
+    """
+    Picks the simplification level for a request.
+
+    - tolerance: largest available level not exceeding the requested tolerance (meters).
+    - zoom: largest level below the ground resolution of one web-mercator pixel at
+      that zoom (approximated at the city latitude), i.e. simplification stays invisible.
+    - neither: full resolution.
+    """
+    levels = sorted(levels)
+    if tolerance is None and zoom is not None:
+        # Web-mercator meters per pixel at zoom 0 (256px tiles), scaled for ~51.2°N
+        tolerance = 156543.03 * 0.626 / (2 ** zoom)
+    if tolerance is None:
+        return levels[0]
+
+    chosen = levels[0]
+    for level in levels:
+        if level <= tolerance:
+            chosen = level
+    return chosen
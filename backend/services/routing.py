@@ -1,20 +1,38 @@
 import datetime
+import numpy as np
+import pandas as pd
 import shapely
+from scipy.spatial import cKDTree
 from r5py import Isochrones, TransportMode, TravelTimeMatrix
-from core.config import WALK_SPEED, CYCLE_SPEED
+from core.config import (
+    WALK_SPEED,
+    CYCLE_SPEED,
+    ROUTING_ORIGIN_CHUNK,
+    ROUTING_MAX_TIME,
+    ROUTING_DIRECTION,
+    PRUNE_SEED_K,
+    PRUNE_SPEED_FACTOR,
+    PRUNE_SEED_DETOUR,
+    PRUNE_TILE_SIZE,
+    ISOCHRONE_CONCAVE_RATIO,
+)
 
-def calculate_isochrones(network, lat: float, lon: float, mode: str, threshold: int):
+def calculate_isochrones(network, lat: float, lon: float, mode: str, thresholds: list[int], outline: str = "convex"):
     """
-    Calculates a single isochrone polygon for the given origin and time threshold.
+    Calculates nested isochrone polygons for one origin and several time thresholds.
 
     Notes:
     - R5 is configured with WALK transport mode for both "walk" and "bike".
       For cycling, speed is approximated by adjusting `speed_walking` because
       TransportMode.BICYCLE produced inconsistent results in this project setup.
-    - The returned geometry is converted to a convex hull to ensure a valid, simple polygon.
+    - All thresholds are derived from a single travel time surface (one R5 run).
+    - outline="convex" converts each ring to its convex hull (valid, simple polygon);
+      outline="concave" keeps more of the routed shape via a concave hull
+      (ISOCHRONE_CONCAVE_RATIO). Each ring is merged with the next smaller one so
+      rings stay nested.
 
     Returns:
-        GeoJSON Feature with:
+        GeoJSON FeatureCollection ordered by ascending travel time, each Feature with:
         - properties.travel_time (minutes)
         - geometry (Polygon)
     """
@@ -30,23 +48,47 @@ def calculate_isochrones(network, lat: float, lon: float, mode: str, threshold:
         t_modes = [TransportMode.WALK]
         speed_kwargs = {"speed_walking": CYCLE_SPEED}
 
+    thresholds = sorted({int(t) for t in thresholds})
 
     iso = Isochrones(
         network,
         origins=center,
         transport_modes=t_modes,
-        isochrones=[threshold],
+        isochrones=thresholds,
         **speed_kwargs,
     )
 
-    geom = iso.iloc[0].geometry
-    poly = geom.convex_hull
+    # Rows are matched to thresholds by their own travel time (a Timedelta in r5py);
+    # R5 omits thresholds that reach no point, which then get an empty ring
+    travel_time = iso["travel_time"]
+    if pd.api.types.is_timedelta64_dtype(travel_time):
+        minutes = travel_time.dt.total_seconds() / 60.0
+    else:
+        minutes = travel_time.astype(float)
+    rings = dict(zip(minutes.round().astype(int), iso.geometry))
+
+    features = []
+    inner = None
+    for threshold in thresholds:
+        geom = rings.get(threshold)
+        if geom is None or geom.is_empty:
+            poly = shapely.Polygon()
+        elif outline == "concave":
+            poly = shapely.concave_hull(geom, ratio=ISOCHRONE_CONCAVE_RATIO)
+        else:
+            poly = geom.convex_hull
+
+        if inner is not None:
+            poly = poly.union(inner)
+        inner = poly
 
-    return {
-        "type": "Feature",
-        "properties": {"travel_time": int(threshold)},
-        "geometry": shapely.geometry.mapping(poly),
-    }
+        features.append({
+            "type": "Feature",
+            "properties": {"travel_time": threshold},
+            "geometry": shapely.geometry.mapping(poly),
+        })
+
+    return {"type": "FeatureCollection", "features": features}
 
 
 def build_travel_time_matrix(network, origins_gdf, destinations_gdf, mode: str):
@@ -67,3 +109,378 @@ def build_travel_time_matrix(network, origins_gdf, destinations_gdf, mode: str):
         transport_modes=t_modes,
         departure=datetime.datetime(2026, 1, 1, 8, 0),
     )
+
+
+def aggregate_travel_times(travel_time_matrix, pois_df, count_thresholds=()):
+    """
+    Reduces a long travel time matrix to one row per (origin, category).
+
+    - travel_time: minimum travel time to any POI of the category
+    - n_<minutes>: number of POIs of the category reachable within each threshold
+      (cumulative opportunities), counted vectorized from the same matrix
+
+    Unreachable pairs (NaN travel time) are dropped before aggregation.
+
+    Returns:
+        DataFrame with columns from_id, category, travel_time, n_<minutes>...
+    """
+    # Attach POI categories to matrix rows to enable per-category aggregation
+    poi_cats = pois_df[["id", "category"]].astype({"category": "category"})
+    tt = travel_time_matrix.dropna(subset=["travel_time"]).merge(
+        poi_cats,
+        left_on="to_id",
+        right_on="id",
+        how="left",
+    )
+
+    aggs = {"travel_time": "min"}
+    for t in count_thresholds:
+        tt[f"n_{t}"] = tt["travel_time"] <= t
+        aggs[f"n_{t}"] = "sum"
+
+    out = tt.groupby(["from_id", "category"], observed=True).agg(aggs).reset_index()
+    out["category"] = out["category"].astype(str)
+    return out
+
+
+def _matrix_chunks(network, sources_gdf, targets_gdf, speed_kwargs: dict, chunk_size: int, max_time: int):
+    """
+    Yields R5 travel time matrices for consecutive chunks of `sources_gdf`.
+    """
+    for start in range(0, len(sources_gdf), chunk_size):
+        yield TravelTimeMatrix(
+            network,
+            origins=sources_gdf.iloc[start:start + chunk_size],
+            destinations=targets_gdf,
+            transport_modes=[TransportMode.WALK],
+            departure=datetime.datetime(2026, 1, 1, 8, 0),
+            max_time=datetime.timedelta(minutes=max_time),
+            **speed_kwargs,
+        )
+
+
+def _reverse_mask(pois_df, n_origins: int, direction: str):
+    """
+    Boolean mask over `pois_df` of the POIs searched from (see `chunked_travel_times`).
+    """
+    if direction == "auto":
+        counts = pois_df["category"].value_counts()
+        sparse_cats = counts.index[counts < n_origins]
+        return pois_df["category"].isin(sparse_cats).to_numpy()
+    return np.full(len(pois_df), direction == "pois")
+
+
+def chunked_travel_times(
+    network,
+    origins_gdf,
+    destinations_gdf,
+    pois_df,
+    speed_kwargs: dict,
+    count_thresholds=(),
+    chunk_size: int = ROUTING_ORIGIN_CHUNK,
+    direction: str = ROUTING_DIRECTION,
+    max_time: int = ROUTING_MAX_TIME,
+):
+    """
+    Routes origins to destinations in chunks and aggregates each chunk immediately.
+
+    Only the reduced per-(origin, category) rows of each chunk are kept, so peak
+    memory is bounded by `chunk_size` x destinations rather than all origins x
+    destinations. Mode handling matches `calculate_isochrones` (WALK + adjusted speed).
+
+    Routing direction:
+    - "cells": origins -> destinations (one search per origin)
+    - "pois": destinations -> origins, transposed afterwards
+    - "auto": per category, whichever side is smaller is searched from. Sparse
+      categories (few POIs, many cells) then cost one search per POI.
+
+    Walking is treated as symmetric; with an elevation model, uphill/downhill
+    legs swap in the reversed direction, which can shift single cells by a minute.
+
+    Travel times above `max_time` (minutes) are treated as unreachable.
+
+    Returns:
+        Same layout as `aggregate_travel_times`.
+    """
+    reverse = _reverse_mask(pois_df, len(origins_gdf), direction)
+
+    partials = []
+
+    forward = ~reverse
+    if forward.any():
+        for matrix in _matrix_chunks(network, origins_gdf, destinations_gdf[forward], speed_kwargs, chunk_size, max_time):
+            partials.append(aggregate_travel_times(matrix, pois_df[forward], count_thresholds))
+            del matrix
+
+    if reverse.any():
+        n_sources = int(reverse.sum())
+        # Same memory bound as forward routing: chunk_size x POIs matrix rows per chunk
+        reverse_chunk = max(1, chunk_size * n_sources // max(len(origins_gdf), 1))
+        for matrix in _matrix_chunks(
+            network, destinations_gdf[reverse], origins_gdf, speed_kwargs, reverse_chunk, max_time
+        ):
+            # POIs were searched from: swap ids back to (cell, POI)
+            matrix = matrix.rename(columns={"from_id": "to_id", "to_id": "from_id"})
+            partials.append(aggregate_travel_times(matrix, pois_df[reverse], count_thresholds))
+            del matrix
+
+    return combine_travel_times(partials, count_thresholds)
+
+
+def pivot_travel_times(tt_min_cat, count_thresholds=()):
+    """
+    Pivots aggregated travel times to wide format, one row per origin.
+
+    Columns: from_id, tt_<category>, n_<category>_<minutes>.
+    """
+    value_cols = ["travel_time"] + [f"n_{t}" for t in count_thresholds]
+    wide = tt_min_cat.pivot(index="from_id", columns="category", values=value_cols)
+
+    names = []
+    for value, cat in wide.columns:
+        if value == "travel_time":
+            names.append(f"tt_{cat}")
+        else:
+            names.append(f"n_{cat}_{value[2:]}")
+    wide.columns = names
+
+    return wide.reset_index()
+
+
+def combine_travel_times(partials, count_thresholds=()):
+    """
+    Merges partial aggregates from separate routing runs (origin chunks, POI chunks
+    or disjoint destination sets) into one row per (origin, category).
+
+    Minimum travel times combine by min, reachable-POI counts by sum.
+    """
+    partials = [p for p in partials if not p.empty]
+    if not partials:
+        return pd.DataFrame(columns=["from_id", "category", "travel_time"])
+    if len(partials) == 1:
+        return partials[0]
+
+    aggs = {"travel_time": "min"}
+    for t in count_thresholds:
+        aggs[f"n_{t}"] = "sum"
+
+    return pd.concat(partials, ignore_index=True).groupby(["from_id", "category"]).agg(aggs).reset_index()
+
+
+def _candidate_travel_times(
+    network,
+    origins_gdf,
+    origins_xy,
+    bounds: dict,
+    trees: dict,
+    exclude,
+    destinations_gdf,
+    pois_df,
+    speed_kwargs: dict,
+    count_thresholds,
+    meters_per_min: float,
+):
+    """
+    Routes origins to the POIs within their per-category lower-bound radius.
+
+    `bounds` maps each category to the per-origin travel time bound (minutes) that
+    still has to be covered; POIs flagged in `exclude` are skipped. Only origins with
+    candidates are routed, to the union of their candidates, with `max_time` capped
+    at the largest bound among them.
+
+    Returns:
+        Aggregated travel times, or None if no origin has candidates.
+    """
+    dest_mask = np.zeros(len(destinations_gdf), dtype=bool)
+    origin_mask = np.zeros(len(origins_gdf), dtype=bool)
+    max_bound = 0.0
+
+    for cat, (idx, tree) in trees.items():
+        bound = bounds[cat]
+        # +1 minute: R5 reports whole minutes
+        hits = tree.query_ball_point(origins_xy, r=meters_per_min * (bound + 1.0))
+        lengths = np.fromiter((len(h) for h in hits), dtype=int, count=len(hits))
+        if not lengths.sum():
+            continue
+
+        poi_idx = idx[np.concatenate([h for h in hits if h])]
+        origin_idx = np.repeat(np.arange(len(hits)), lengths)
+
+        keep = ~exclude[poi_idx]
+        if not keep.any():
+            continue
+        dest_mask[poi_idx[keep]] = True
+        origin_mask[origin_idx[keep]] = True
+        max_bound = max(max_bound, float(bound[origin_idx[keep]].max()))
+
+    if not dest_mask.any():
+        return None
+
+    return chunked_travel_times(
+        network,
+        origins_gdf[origin_mask],
+        destinations_gdf[dest_mask],
+        pois_df[dest_mask],
+        speed_kwargs,
+        count_thresholds=count_thresholds,
+        direction="cells",
+        max_time=min(ROUTING_MAX_TIME, int(np.ceil(max_bound)) + 1),
+    )
+
+
+def pruned_travel_times(
+    network,
+    origins_gdf,
+    origins_xy,
+    destinations_gdf,
+    destinations_xy,
+    pois_df,
+    speed_kwargs: dict,
+    count_thresholds=(),
+    direction: str = ROUTING_DIRECTION,
+):
+    """
+    Routes origins only to destinations that can still matter for them.
+
+    Categories that `direction` routes from the POI side already cost one search
+    per POI; pruning would only split them into more R5 calls, so they are routed
+    unpruned. The remaining categories are searched from the cells, where pruning
+    caps each search's `max_time` and destination set.
+
+    Network travel time is bounded below by straight-line distance at the
+    configured speed (scaled by PRUNE_SPEED_FACTOR for downhill speedups from the
+    elevation model). Origins are grouped into PRUNE_TILE_SIZE tiles (EPSG:3035);
+    per tile:
+
+    1. A KD-tree over POI coordinates picks the PRUNE_SEED_K nearest POIs per
+       origin and category. The tile is routed to these seeds with `max_time`
+       limited to PRUNE_SEED_DETOUR x the straight-line time of the farthest seed,
+       which yields an upper bound for each origin's minimum travel time.
+    2. Any other POI is a candidate for an origin only if its lower bound does not
+       exceed that upper bound (or the largest count threshold). The origins are
+       routed to the union of their own candidates, with `max_time` capped at the
+       largest bound they need.
+    3. Origins with a category whose seeds were not reached within the seed limit
+       drop their seed results and are routed to every POI within ROUTING_MAX_TIME
+       of their lower bound instead.
+
+    Seed and candidate POIs are disjoint per origin, so the result has the same
+    minima and counts as routing every origin to every destination (apart from the
+    direction caveat of `chunked_travel_times`); scripts/compare_pruning.py checks
+    this against the stub router. Candidate lookups and matrices are bounded by the
+    origins of one tile x POIs.
+
+    Args:
+        origins_xy, destinations_xy: (n, 2) arrays in EPSG:3035, positionally
+            aligned with origins_gdf and destinations_gdf/pois_df.
+
+    Returns:
+        Same layout as `aggregate_travel_times`.
+    """
+    if len(destinations_gdf) == 0 or len(origins_gdf) == 0:
+        return combine_travel_times([], count_thresholds)
+
+    partials = []
+
+    reverse = _reverse_mask(pois_df, len(origins_gdf), direction)
+    if reverse.any():
+        partials.append(
+            chunked_travel_times(
+                network,
+                origins_gdf,
+                destinations_gdf[reverse],
+                pois_df[reverse],
+                speed_kwargs,
+                count_thresholds=count_thresholds,
+                direction="pois",
+            )
+        )
+        if reverse.all():
+            return combine_travel_times(partials, count_thresholds)
+
+        forward = ~reverse
+        destinations_gdf = destinations_gdf[forward]
+        destinations_xy = destinations_xy[forward]
+        pois_df = pois_df[forward]
+
+    n_dest = len(destinations_gdf)
+
+    # Nominal and lower-bound speed in meters per minute
+    nominal_meters_per_min = speed_kwargs["speed_walking"] * 1000.0 / 60.0
+    meters_per_min = nominal_meters_per_min * PRUNE_SPEED_FACTOR
+    t_count = max(count_thresholds, default=0)
+
+    categories = pois_df["category"].to_numpy()
+    trees = {}
+    for cat in pd.unique(categories):
+        idx = np.flatnonzero(categories == cat)
+        trees[cat] = (idx, cKDTree(destinations_xy[idx]))
+
+    tile_keys = np.floor(origins_xy / PRUNE_TILE_SIZE).astype(np.int64)
+    tiles = pd.DataFrame(tile_keys).groupby([0, 1]).indices
+
+    no_pois = np.zeros(n_dest, dtype=bool)
+
+    for members in tiles.values():
+        tile_origins = origins_gdf.iloc[members]
+        tile_xy = origins_xy[members]
+
+        # 1) Seeds: nearest POIs per origin and category
+        seed_mask = np.zeros(n_dest, dtype=bool)
+        seed_dist = 0.0
+        for idx, tree in trees.values():
+            k = min(PRUNE_SEED_K, len(idx))
+            dist, nearest = tree.query(tile_xy, k=k)
+            seed_mask[idx[np.unique(nearest)]] = True
+            seed_dist = max(seed_dist, float(np.max(dist)))
+
+        seed_time = int(np.ceil(seed_dist / nominal_meters_per_min * PRUNE_SEED_DETOUR)) + 1
+        seed_time = min(ROUTING_MAX_TIME, max(seed_time, t_count))
+
+        first = chunked_travel_times(
+            network,
+            tile_origins,
+            destinations_gdf[seed_mask],
+            pois_df[seed_mask],
+            speed_kwargs,
+            count_thresholds=count_thresholds,
+            direction="cells",
+            max_time=seed_time,
+        )
+
+        origin_ids = tile_origins["id"].to_numpy()
+        fallback = np.zeros(len(members), dtype=bool)
+        bounds = {}
+        for cat in trees:
+            upper = (
+                first.loc[first["category"] == cat]
+                .set_index("from_id")["travel_time"]
+                .reindex(origin_ids)
+                .to_numpy(dtype=float)
+            )
+            fallback |= np.isnan(upper)
+            bounds[cat] = np.maximum(np.nan_to_num(upper, nan=ROUTING_MAX_TIME), t_count)
+
+        partials.append(first[~first["from_id"].isin(origin_ids[fallback])])
+
+        # 2) Candidates that were not seeds; 3) fallback origins to all POIs in range
+        for group, exclude in ((~fallback, seed_mask), (fallback, no_pois)):
+            if not group.any():
+                continue
+            tt = _candidate_travel_times(
+                network,
+                tile_origins[group],
+                tile_xy[group],
+                {cat: bound[group] for cat, bound in bounds.items()},
+                trees,
+                exclude,
+                destinations_gdf,
+                pois_df,
+                speed_kwargs,
+                count_thresholds,
+                meters_per_min,
+            )
+            if tt is not None:
+                partials.append(tt)
+
+    return combine_travel_times(partials, count_thresholds)
@@ -1,8 +1,9 @@
+import numpy as np
 import pandas as pd
 from pyproj import Transformer
 from shapely.geometry import Polygon, mapping
 
-from core.config import CSV_PATH_GRID, HALF
+from core.config import GRID_PATH, HALF
 
 to_wgs84 = Transformer.from_crs(3035, 4326, always_xy=True)
 to_laea = Transformer.from_crs(4326, 3035, always_xy=True)
@@ -10,7 +11,10 @@ to_laea = Transformer.from_crs(4326, 3035, always_xy=True)
 
 def load_grid_df():
     """
-    Loads the census grid (100m) CSV and normalizes column types.
+    Loads the census grid (100m) and normalizes column types.
+
+    Reads the Parquet output of scripts/assign_districts.py when GRID_PATH
+    points to a .parquet file, otherwise the semicolon-separated CSV.
 
     Returns:
         DataFrame with the minimal column set required by the routing pipeline:
@@ -19,7 +23,10 @@ def load_grid_df():
         - Bevoelkerungszahl (float/int; population)
         - district_id (nullable int)
     """
-    df_grid = pd.read_csv(CSV_PATH_GRID, sep=";", encoding="utf-8-sig")
+    if GRID_PATH.endswith(".parquet"):
+        df_grid = pd.read_parquet(GRID_PATH)
+    else:
+        df_grid = pd.read_csv(GRID_PATH, sep=";", encoding="utf-8-sig")
 
     df_grid["x_mp_100m"] = pd.to_numeric(df_grid["x_mp_100m"], errors="coerce")
     df_grid["y_mp_100m"] = pd.to_numeric(df_grid["y_mp_100m"], errors="coerce")
@@ -72,22 +79,71 @@ def filter_grid_by_bbox(df_grid, bbox: str | None, limit: int):
     return data
 
 
-def cell_polygon_wgs84(x: float, y: float):
+def aggregate_grid(cells, block_size: float):
+    """
+    Aggregates 100m census cells to coarser square blocks (e.g. 500m or 1km).
+
+    Blocks are aligned to the EPSG:3035 origin like the census grid itself.
+    The result keeps the census column names so it can run through the same
+    routing pipeline:
+    - GITTER_ID_100m: block id (CRS3035RES<size>mN<y>E<x>)
+    - x_mp_100m, y_mp_100m: block midpoint
+    - Bevoelkerungszahl: summed population (NaN if no cell has a value)
+    - district_id: district covering most cells of the block
+    """
+    size = int(block_size)
+    bx = np.floor(cells["x_mp_100m"].to_numpy() / size) * size
+    by = np.floor(cells["y_mp_100m"].to_numpy() / size) * size
+
+    df = pd.DataFrame(
+        {
+            "bx": bx,
+            "by": by,
+            "Bevoelkerungszahl": cells["Bevoelkerungszahl"].to_numpy(),
+            "district_id": cells["district_id"].to_numpy(),
+        }
+    )
+
+    blocks = df.groupby(["bx", "by"]).agg(
+        Bevoelkerungszahl=("Bevoelkerungszahl", lambda v: v.sum(min_count=1))
+    )
+
+    # Majority district per block
+    district_counts = df.dropna(subset=["district_id"]).groupby(["bx", "by", "district_id"]).size()
+    if not district_counts.empty:
+        majority = district_counts.reset_index(name="n").sort_values("n", ascending=False)
+        majority = majority.drop_duplicates(["bx", "by"]).set_index(["bx", "by"])["district_id"]
+        blocks["district_id"] = majority.reindex(blocks.index).astype("Int64")
+    else:
+        blocks["district_id"] = pd.array([pd.NA] * len(blocks), dtype="Int64")
+
+    blocks = blocks.reset_index()
+    blocks["GITTER_ID_100m"] = [
+        f"CRS3035RES{size}mN{int(y)}E{int(x)}" for x, y in zip(blocks["bx"], blocks["by"])
+    ]
+    blocks["x_mp_100m"] = blocks["bx"] + size / 2.0
+    blocks["y_mp_100m"] = blocks["by"] + size / 2.0
+
+    return blocks[["GITTER_ID_100m", "x_mp_100m", "y_mp_100m", "Bevoelkerungszahl", "district_id"]]
+
+
+def cell_polygon_wgs84(x: float, y: float, half: float = HALF):
     """
     Builds a GeoJSON polygon (WGS84) for a 100m grid cell given its midpoint in EPSG:3035.
 
     Args:
         x, y: cell midpoint coordinates in EPSG:3035 (meters)
+        half: half the cell edge length (defaults to the 100m census cell)
 
     Returns:
         GeoJSON-like mapping for a Polygon in EPSG:4326.
     """
     corners_laea = [
-        (x - HALF, y - HALF),
-        (x + HALF, y - HALF),
-        (x + HALF, y + HALF),
-        (x - HALF, y + HALF),
-        (x - HALF, y - HALF),
+        (x - half, y - half),
+        (x + half, y - half),
+        (x + half, y + half),
+        (x - half, y + half),
+        (x - half, y - half),
     ]
     ring = [to_wgs84.transform(cx, cy) for (cx, cy) in corners_laea]
     poly = Polygon(ring)
@@ -18,6 +18,9 @@ export default function CityScope() {
 
   // API results
   const [cityScopeLayer, setCityScopeLayer] = useState(null);
+  // Last response with its request body and ETag, reused when the backend reports
+  // it unchanged (412 on a matching If-None-Match)
+  const lastResultRef = useRef(null);
 
   // Derived results
   const [gridStats, setGridStats] = useState(null);
@@ -71,32 +74,51 @@ export default function CityScope() {
       setError(null);
 
       try {
+        const body = JSON.stringify({
+          mode,
+          categories: normalizedCategories,
+          bbox,
+          currentMinutes: minutes,
+          removed_poi_ids: Array.from(removedPoiIds).map(Number),
+          user_pois: addedUserPois.map((p) => ({
+            lat: p.lat,
+            lon: p.lon,
+            category: p.category,
+            name: p.name || null,
+          })),
+        });
+
+        const headers = { "Content-Type": "application/json" };
+        const last = lastResultRef.current;
+        if (last?.etag && last.body === body) {
+          headers["If-None-Match"] = last.etag;
+        }
+
         const res = await fetch("/api/cityscope", {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({
-            mode,
-            categories: normalizedCategories,
-            bbox,
-            currentMinutes: minutes,
-            removed_poi_ids: Array.from(removedPoiIds).map(Number),
-            user_pois: addedUserPois.map((p) => ({
-              lat: p.lat,
-              lon: p.lon,
-              category: p.category,
-              name: p.name || null,
-            })),
-          }),
+          headers,
+          body,
         });
 
-        if (!res.ok) {
-          await res.text(); // keep for debugging if needed later
-          throw new Error(
-            "Untersuchungsgebiet übersteigt Test-Server-Limits. (Bitte kleiner wählen)",
-          );
+        let featureCollection;
+        if (res.status === 412 && last?.body === body) {
+          // Same scenario and unchanged data: keep the previous result
+          featureCollection = last.data;
+        } else {
+          if (!res.ok) {
+            await res.text(); // keep for debugging if needed later
+            throw new Error(
+              "Untersuchungsgebiet übersteigt Test-Server-Limits. (Bitte kleiner wählen)",
+            );
+          }
+
+          featureCollection = await res.json();
+          lastResultRef.current = {
+            body,
+            etag: res.headers.get("ETag"),
+            data: featureCollection,
+          };
         }
-
-        const featureCollection = await res.json();
         setCityScopeLayer(featureCollection);
 
         if (analysisLevel === "grid") {
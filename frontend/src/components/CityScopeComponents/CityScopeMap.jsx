@@ -35,6 +35,8 @@ export default function CityScopeMap({
   const roiLayerRef = useRef(null);
 
   const [districtGeo, setDistrictGeo] = useState(null);
+  // Map zoom, used to request district outlines simplified for the current scale
+  const [mapZoom, setMapZoom] = useState(12);
 
   /**
    * Converts Leaflet bounds to a bbox string in map order:
@@ -171,16 +173,17 @@ export default function CityScopeMap({
   };
 
   /**
-   * Loads district polygons once (used for "district" analysis level).
+   * Loads district polygons (used for "district" analysis level) in the
+   * simplification level matching the current map zoom.
    */
   useEffect(() => {
-    fetch("/api/districts")
+    fetch(`/api/districts?zoom=${mapZoom}`)
       .then((r) => r.json())
       .then(setDistrictGeo)
       .catch((err) =>
         console.error("Fehler beim Laden von districts.geojson:", err),
       );
-  }, []);
+  }, [mapZoom]);
 
   /**
    * Initializes the Leaflet map once, including:
@@ -254,6 +257,9 @@ export default function CityScopeMap({
 
     map.on(L.Draw.Event.CREATED, onCreated);
 
+    const onZoomEnd = () => setMapZoom(Math.round(map.getZoom()));
+    map.on("zoomend", onZoomEnd);
+
     // Legend control
     legendRef.current = L.control({ position: "bottomright" });
     legendRef.current.onAdd = () => {
@@ -287,6 +293,7 @@ export default function CityScopeMap({
 
     return () => {
       map.off(L.Draw.Event.CREATED, onCreated);
+      map.off("zoomend", onZoomEnd);
 
       if (allPoisLayerRef.current) {
         allPoisLayerRef.current.remove();
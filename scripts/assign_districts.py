@@ -1,48 +1,45 @@
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
 
 CSV_PATH_GRID_IN = "data/census_100m.csv"
-CSV_PATH_GRID_OUT = "data/census_100m_with_district.csv"
+PARQUET_PATH_GRID_OUT = "data/census_100m_with_district.parquet"
 DISTRICTS_SHP = "data/districts.shp"
 
 DISTRICT_ID_COL = "id"
 
+GRID_COLUMNS = ["GITTER_ID_100m", "x_mp_100m", "y_mp_100m", "Bevoelkerungszahl"]
 
-def main():
-    """
-    Enriches the 100m census grid with district identifiers via a spatial join.
+OUTPUT_SCHEMA = pa.schema(
+    [
+        ("GITTER_ID_100m", pa.string()),
+        ("x_mp_100m", pa.float64()),
+        ("y_mp_100m", pa.float64()),
+        ("Bevoelkerungszahl", pa.float64()),
+        ("district_id", pa.int64()),
+    ]
+)
 
-    Steps:
-    - Load the census CSV (EPSG:3035 midpoints) and coerce numeric types.
-    - Load district polygons and reproject to EPSG:3035.
-    - Clip census points to the districts' bounding box (performance prefilter).
-    - Spatially join points to polygons (predicate="within") to assign `district_id`.
-    - Write the enriched table back to CSV for fast loading in the API.
+# Per-worker district index, built once by _init_worker
+_tree = None
+_district_ids = None
+_bounds = None
 
-    Output columns:
-    - GITTER_ID_100m, x_mp_100m, y_mp_100m, Bevoelkerungszahl, district_id
-    """
-    # 1) Load census CSV and normalize types
-    df = pd.read_csv(
-        CSV_PATH_GRID_IN,
-        sep=";",
-        names=["GITTER_ID_100m", "x_mp_100m", "y_mp_100m", "Bevoelkerungszahl"],
-        encoding="utf-8-sig",
-    )
 
-    df["x_mp_100m"] = pd.to_numeric(df["x_mp_100m"], errors="coerce")
-    df["y_mp_100m"] = pd.to_numeric(df["y_mp_100m"], errors="coerce")
-    df["Bevoelkerungszahl"] = pd.to_numeric(df["Bevoelkerungszahl"], errors="coerce")
-
-    # 2) Build point GeoDataFrame from cell midpoints (EPSG:3035)
-    gdf_grid = gpd.GeoDataFrame(
-        df,
-        geometry=gpd.points_from_xy(df["x_mp_100m"], df["y_mp_100m"]),
-        crs="EPSG:3035",
-    )
-
-    # 3) Load districts and ensure EPSG:3035 for spatial operations in meters
-    districts = gpd.read_file(DISTRICTS_SHP)
+def load_districts(path: str):
+    """
+    Loads district polygons, reprojects them to EPSG:3035 and validates the id column.
+    """
+    districts = gpd.read_file(path)
 
     if districts.crs is None:
         raise RuntimeError("districts.shp has no CRS set; assign it before running this script.")
@@ -55,37 +52,145 @@ def main():
             f"Available columns: {list(districts.columns)}"
         )
 
-    # 4) Prefilter by districts' bounding box to reduce join cost
-    minx, miny, maxx, maxy = districts.total_bounds
-    gdf_grid = gdf_grid.cx[minx:maxx, miny:maxy]
-    print(f"Cells after bbox prefilter: {len(gdf_grid)}")
-
-    # 5) Spatial join: assign district id where the point lies within a district polygon
-    joined = gpd.sjoin(
-        gdf_grid,
-        districts[[DISTRICT_ID_COL, "geometry"]],
-        how="left",
-        predicate="within",
-    )
+    # Workers receive the ids as a plain int64 array: reject missing or fractional ids
+    ids = pd.to_numeric(districts[DISTRICT_ID_COL], errors="coerce")
+    invalid = ids.isna() | (ids % 1 != 0)
+    if invalid.any():
+        raise RuntimeError(
+            f"{int(invalid.sum())} district(s) without a valid integer {DISTRICT_ID_COL!r}: "
+            f"{districts.loc[invalid, DISTRICT_ID_COL].tolist()[:10]}"
+        )
+    districts[DISTRICT_ID_COL] = ids.astype("int64")
+
+    return districts
+
 
-    joined = joined.rename(columns={DISTRICT_ID_COL: "district_id"})
-    joined["district_id"] = joined["district_id"].astype("Int64")
+def _init_worker(geoms_wkb: list[bytes], district_ids: np.ndarray):
+    """
+    Builds the STRtree over district polygons once per worker process.
+
+    Polygons are shipped as WKB so the (small) district layer is the only state
+    shared with the workers; census chunks are streamed to them one at a time.
+    """
+    global _tree, _district_ids, _bounds
+    geoms = shapely.from_wkb(geoms_wkb)
+    _tree = shapely.STRtree(geoms)
+    _district_ids = district_ids
+    _bounds = shapely.total_bounds(geoms)
+
+
+def _assign_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizes one census chunk and assigns district ids via the STRtree.
+
+    - Coerces numeric columns and drops rows without valid midpoints (e.g. header rows).
+    - Keeps only cells inside the districts' bounding box (same prefilter as before).
+    - Points on a shared border match the first district returned by the index.
+    """
+    chunk["x_mp_100m"] = pd.to_numeric(chunk["x_mp_100m"], errors="coerce")
+    chunk["y_mp_100m"] = pd.to_numeric(chunk["y_mp_100m"], errors="coerce")
+    chunk["Bevoelkerungszahl"] = pd.to_numeric(chunk["Bevoelkerungszahl"], errors="coerce")
+
+    minx, miny, maxx, maxy = _bounds
+    x = chunk["x_mp_100m"]
+    y = chunk["y_mp_100m"]
+    chunk = chunk[(x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy)].reset_index(drop=True)
+
+    points = shapely.points(chunk["x_mp_100m"].to_numpy(), chunk["y_mp_100m"].to_numpy())
+    point_idx, district_idx = _tree.query(points, predicate="within")
+
+    values = np.zeros(len(chunk), dtype="int64")
+    missing = np.ones(len(chunk), dtype=bool)
+    if len(point_idx):
+        # Keep the first hit per point
+        first = np.unique(point_idx, return_index=True)[1]
+        values[point_idx[first]] = _district_ids[district_idx[first]]
+        missing[point_idx[first]] = False
 
-    # 6) Drop GeoPandas join artifacts to keep the output as a pure table
-    joined = joined.drop(columns=["index_right", "geometry"])
+    chunk["district_id"] = pd.arrays.IntegerArray(values, missing)
+    chunk["GITTER_ID_100m"] = chunk["GITTER_ID_100m"].astype(str)
+    return chunk
 
-    print("Result columns:", joined.columns.tolist())
-    print("Example district IDs:", joined["district_id"].dropna().unique()[:10])
 
-    # 7) Write enriched CSV for API consumption
-    joined.to_csv(
-        CSV_PATH_GRID_OUT,
+def main():
+    """
+    Enriches the 100m census grid with district identifiers via a spatial join.
+
+    The census CSV is streamed in chunks, so memory stays bounded by
+    `--chunksize x 2 * --workers` rows regardless of the input size (e.g. the nationwide grid).
+
+    Steps:
+    - Load district polygons, reproject to EPSG:3035 and build an STRtree per worker.
+    - Read the census CSV (EPSG:3035 midpoints) chunk by chunk and distribute
+      chunks across processes.
+    - Per chunk: coerce numeric types, clip to the districts' bounding box and
+      look up the containing district (predicate="within").
+    - Append each finished chunk (in input order) to a Parquet file.
+
+    Output columns:
+    - GITTER_ID_100m, x_mp_100m, y_mp_100m, Bevoelkerungszahl, district_id
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", default=CSV_PATH_GRID_IN)
+    parser.add_argument("--output", default=PARQUET_PATH_GRID_OUT)
+    parser.add_argument("--districts", default=DISTRICTS_SHP)
+    parser.add_argument("--chunksize", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # 1) Districts: shipped to the workers once as WKB
+    districts = load_districts(args.districts)
+    geoms_wkb = shapely.to_wkb(districts.geometry.values).tolist()
+    district_ids = districts[DISTRICT_ID_COL].to_numpy(dtype="int64")
+
+    # 2) Stream the census CSV
+    reader = pd.read_csv(
+        args.input,
         sep=";",
-        index=False,
+        names=GRID_COLUMNS,
+        dtype={"GITTER_ID_100m": str},
         encoding="utf-8-sig",
+        chunksize=args.chunksize,
     )
 
-    print(f"Done. File written to: {CSV_PATH_GRID_OUT}")
+    rows_in = 0
+    rows_out = 0
+    assigned = 0
+    started = time.monotonic()
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(geoms_wkb, district_ids),
+    ) as pool, pq.ParquetWriter(args.output, OUTPUT_SCHEMA) as writer:
+        # Bounded window of in-flight chunks keeps memory flat and output ordered
+        pending = deque()
+        max_pending = 2 * args.workers
+
+        def drain_one():
+            nonlocal rows_out, assigned
+            result = pending.popleft().result()
+            rows_out += len(result)
+            assigned += int(result["district_id"].notna().sum())
+            writer.write_table(pa.Table.from_pandas(result, schema=OUTPUT_SCHEMA, preserve_index=False))
+
+            elapsed = time.monotonic() - started
+            print(
+                f"  {rows_in:,} rows read, {rows_out:,} written "
+                f"({assigned:,} with district) – {rows_in / max(elapsed, 1e-9):,.0f} rows/s"
+            )
+
+        for chunk in reader:
+            rows_in += len(chunk)
+            pending.append(pool.submit(_assign_chunk, chunk))
+            if len(pending) >= max_pending:
+                drain_one()
+
+        while pending:
+            drain_one()
+
+    print(f"Cells after bbox prefilter: {rows_out}")
+    print(f"Done in {time.monotonic() - started:.1f}s. File written to: {args.output}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,126 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import loadtest  # noqa: E402  (puts backend/ on sys.path)
+from core.config import WALK_SPEED, CYCLE_SPEED, ROUTING_DIRECTION  # noqa: E402
+from services.zensus import to_laea, to_wgs84  # noqa: E402
+import services.routing as routing  # noqa: E402
+
+
+class CountingRouter:
+    """
+    Wraps the stub TravelTimeMatrix and counts R5 calls, searches (origins) and routed pairs.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.searches = 0
+        self.pairs = 0
+
+    def __call__(self, network, origins, destinations, **kwargs):
+        self.calls += 1
+        self.searches += len(origins)
+        self.pairs += len(origins) * len(destinations)
+        return loadtest.StubTravelTimeMatrix(network, origins, destinations, **kwargs)
+
+
+def _inputs(rng: np.random.Generator, n_cells: int):
+    """
+    Origins (populated synthetic cells) and POIs in the layout /api/cityscope passes on.
+    """
+    grid = loadtest.fake_grid(rng)
+    grid = grid[grid["Bevoelkerungszahl"].notna()]
+    if n_cells:
+        grid = grid.sample(n=min(n_cells, len(grid)), random_state=0)
+
+    xs = grid["x_mp_100m"].to_numpy(dtype=float)
+    ys = grid["y_mp_100m"].to_numpy(dtype=float)
+    lons, lats = to_wgs84.transform(xs, ys)
+    origins_gdf = gpd.GeoDataFrame(
+        {"id": grid["GITTER_ID_100m"].astype(str)},
+        geometry=gpd.points_from_xy(lons, lats),
+        crs="EPSG:4326",
+    ).reset_index(drop=True)
+    origins_xy = np.column_stack([xs, ys])
+
+    pois_df = pd.concat(loadtest.fake_poi_cache(rng).values(), ignore_index=True)
+    pois_gdf = gpd.GeoDataFrame(
+        pois_df[["id"]],
+        geometry=gpd.points_from_xy(pois_df["lon"], pois_df["lat"]),
+        crs="EPSG:4326",
+    )
+    pois_xy = np.column_stack(to_laea.transform(pois_df["lon"].to_numpy(), pois_df["lat"].to_numpy()))
+
+    return origins_gdf, origins_xy, pois_gdf, pois_xy, pois_df[["id", "category"]]
+
+
+def _sorted(tt: pd.DataFrame) -> pd.DataFrame:
+    return tt.sort_values(["from_id", "category"]).reset_index(drop=True)
+
+
+def main():
+    """
+    Checks that destination pruning returns exactly the unpruned travel times.
+
+    Runs `pruned_travel_times` and plain `chunked_travel_times` on synthetic cells
+    and POIs with the stub router from loadtest.py, for walking and cycling, and
+    compares minima and reachable-POI counts. Also reports R5 calls, searches and
+    routed pairs. With the default "auto" direction, categories with fewer POIs than
+    cells are routed from the POIs and not pruned; --direction cells prunes all.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument("--cells", type=int, default=3000, help="sampled origin cells (0 = all)")
+    parser.add_argument("--thresholds", type=int, nargs="*", default=[5, 10, 15])
+    parser.add_argument("--direction", choices=["auto", "cells", "pois"], default=ROUTING_DIRECTION)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    origins_gdf, origins_xy, pois_gdf, pois_xy, pois_df = _inputs(np.random.default_rng(args.seed), args.cells)
+    thresholds = sorted(set(args.thresholds))
+    print(f"{len(origins_gdf)} origins, {len(pois_df)} POIs, count thresholds {thresholds}")
+
+    failed = False
+    for mode, speed in (("walk", WALK_SPEED), ("bike", CYCLE_SPEED)):
+        speed_kwargs = {"speed_walking": speed}
+        results = {}
+        for name in ("unpruned", "pruned"):
+            router = CountingRouter()
+            routing.TravelTimeMatrix = router
+            started = time.perf_counter()
+            if name == "pruned":
+                tt = routing.pruned_travel_times(
+                    None, origins_gdf, origins_xy, pois_gdf, pois_xy, pois_df, speed_kwargs,
+                    count_thresholds=thresholds, direction=args.direction,
+                )
+            else:
+                tt = routing.chunked_travel_times(
+                    None, origins_gdf, pois_gdf, pois_df, speed_kwargs,
+                    count_thresholds=thresholds, direction=args.direction,
+                )
+            elapsed = time.perf_counter() - started
+            results[name] = _sorted(tt)
+            print(
+                f"  {mode:<4} {name:<8} {router.calls:>5} calls {router.searches:>8} searches "
+                f"{router.pairs:>12,} pairs {elapsed:7.2f}s"
+            )
+
+        try:
+            pd.testing.assert_frame_equal(results["pruned"], results["unpruned"], check_dtype=False)
+            print(f"  {mode:<4} identical ({len(results['pruned'])} rows)")
+        except AssertionError as exc:
+            failed = True
+            print(f"  {mode:<4} MISMATCH: {exc}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
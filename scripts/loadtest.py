@@ -0,0 +1,417 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import httpx
+from shapely.geometry import Point, box
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from app import app  # noqa: E402
+from core.config import CATS, DISTRICT_ID_COL, CELL_SIZE  # noqa: E402
+from core.http_cache import data_version  # noqa: E402
+from services.districts import build_district_payloads  # noqa: E402
+from services.zensus import to_laea  # noqa: E402
+import services.routing as routing  # noqa: E402
+
+# Synthetic study area around Remscheid city centre (WGS84)
+CENTER_LON, CENTER_LAT = 7.19, 51.18
+AREA_HALF_DEG = (0.06, 0.04)  # lon, lat -> roughly 8.4 x 8.9 km
+
+POIS_PER_CATEGORY = {
+    "education": 60,
+    "restaurant": 400,
+    "supermarket": 50,
+    "healthcare": 120,
+    "park": 90,
+    "public_transport": 250,
+}
+
+# Stub router: straight-line distance x detour factor at the requested speed
+DETOUR_FACTOR = 1.3
+# Simulated R5 cost per routed origin (seconds), keeps the stub CPU-bound like R5
+ROUTE_COST_PER_ORIGIN = 0.0002
+
+METERS_PER_DEG_LAT = 111_320.0
+
+
+# ---------------------------------------------------------------------------
+# Stub router
+# ---------------------------------------------------------------------------
+
+def _meters(lon1, lat1, lon2, lat2):
+    """
+    Equirectangular distance in meters (broadcasting), accurate enough at city scale.
+    """
+    kx = METERS_PER_DEG_LAT * math.cos(math.radians(CENTER_LAT))
+    return np.hypot((lon2 - lon1) * kx, (lat2 - lat1) * METERS_PER_DEG_LAT)
+
+
+class StubNetwork:
+    """
+    Stands in for r5py.TransportNetwork; the stub router never looks at it.
+    """
+
+
+def StubTravelTimeMatrix(network, origins, destinations, transport_modes=None, departure=None,
+                         max_time=None, speed_walking=5.0, **kwargs):
+    """
+    Drop-in for r5py.TravelTimeMatrix returning from_id, to_id, travel_time (minutes).
+    """
+    time.sleep(ROUTE_COST_PER_ORIGIN * len(origins))
+
+    o_lon = origins.geometry.x.to_numpy()[:, None]
+    o_lat = origins.geometry.y.to_numpy()[:, None]
+    d_lon = destinations.geometry.x.to_numpy()[None, :]
+    d_lat = destinations.geometry.y.to_numpy()[None, :]
+
+    meters = _meters(o_lon, o_lat, d_lon, d_lat) * DETOUR_FACTOR
+    minutes = np.ceil(meters / (speed_walking * 1000.0 / 60.0))
+    if max_time is not None:
+        minutes[minutes > max_time.total_seconds() / 60.0] = np.nan
+
+    return pd.DataFrame(
+        {
+            "from_id": np.repeat(origins["id"].to_numpy(), len(destinations)),
+            "to_id": np.tile(destinations["id"].to_numpy(), len(origins)),
+            "travel_time": minutes.ravel(),
+        }
+    )
+
+
+def StubIsochrones(network, origins, transport_modes=None, isochrones=(), speed_walking=5.0, **kwargs):
+    """
+    Drop-in for r5py.Isochrones: one circular ring per threshold around the origin.
+    """
+    time.sleep(ROUTE_COST_PER_ORIGIN * 50)
+
+    rows = []
+    for t in isochrones:
+        radius_m = speed_walking * 1000.0 / 60.0 * t / DETOUR_FACTOR
+        ring = Point(origins.x, origins.y).buffer(radius_m / METERS_PER_DEG_LAT, quad_segs=32)
+        rows.append({"travel_time": t, "geometry": ring})
+    return gpd.GeoDataFrame(rows, crs="EPSG:4326")
+
+
+def install_stub_router():
+    routing.TravelTimeMatrix = StubTravelTimeMatrix
+    routing.Isochrones = StubIsochrones
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def fake_grid(rng: np.random.Generator) -> pd.DataFrame:
+    """
+    100m census cells covering the study area (EPSG:3035 midpoints), ~30% unpopulated.
+    """
+    (min_x, min_y) = to_laea.transform(CENTER_LON - AREA_HALF_DEG[0], CENTER_LAT - AREA_HALF_DEG[1])
+    (max_x, max_y) = to_laea.transform(CENTER_LON + AREA_HALF_DEG[0], CENTER_LAT + AREA_HALF_DEG[1])
+
+    xs = np.arange(math.floor(min_x / CELL_SIZE), math.ceil(max_x / CELL_SIZE)) * CELL_SIZE + CELL_SIZE / 2
+    ys = np.arange(math.floor(min_y / CELL_SIZE), math.ceil(max_y / CELL_SIZE)) * CELL_SIZE + CELL_SIZE / 2
+    gx, gy = np.meshgrid(xs, ys)
+    gx, gy = gx.ravel(), gy.ravel()
+
+    pop = rng.poisson(12, size=len(gx)).astype(float)
+    pop[rng.random(len(gx)) < 0.3] = np.nan
+
+    # 3x3 district blocks, matching fake_districts
+    col = np.clip(((gx - gx.min()) / (gx.max() - gx.min() + 1) * 3).astype(int), 0, 2)
+    row = np.clip(((gy - gy.min()) / (gy.max() - gy.min() + 1) * 3).astype(int), 0, 2)
+
+    return pd.DataFrame(
+        {
+            "GITTER_ID_100m": [f"CRS3035RES100mN{int(y - 50)}E{int(x - 50)}" for x, y in zip(gx, gy)],
+            "x_mp_100m": gx,
+            "y_mp_100m": gy,
+            "Bevoelkerungszahl": pop,
+            "district_id": pd.array(row * 3 + col + 1, dtype="Int64"),
+        }
+    )
+
+
+def fake_districts() -> gpd.GeoDataFrame:
+    """
+    3x3 rectangular districts over the study area (WGS84).
+    """
+    lons = np.linspace(CENTER_LON - AREA_HALF_DEG[0], CENTER_LON + AREA_HALF_DEG[0], 4)
+    lats = np.linspace(CENTER_LAT - AREA_HALF_DEG[1], CENTER_LAT + AREA_HALF_DEG[1], 4)
+    rows = []
+    for r in range(3):
+        for c in range(3):
+            rows.append(
+                {
+                    DISTRICT_ID_COL: r * 3 + c + 1,
+                    "name": f"Bezirk {r * 3 + c + 1}",
+                    "geometry": box(lons[c], lats[r], lons[c + 1], lats[r + 1]),
+                }
+            )
+    return gpd.GeoDataFrame(rows, crs="EPSG:4326")
+
+
+def fake_poi_cache(rng: np.random.Generator) -> dict[str, pd.DataFrame]:
+    cache = {}
+    next_id = 1
+    for cat in CATS:
+        n = POIS_PER_CATEGORY.get(cat, 50)
+        cache[cat] = pd.DataFrame(
+            {
+                "id": np.arange(next_id, next_id + n),
+                "lat": CENTER_LAT + rng.uniform(-1, 1, n) * AREA_HALF_DEG[1],
+                "lon": CENTER_LON + rng.uniform(-1, 1, n) * AREA_HALF_DEG[0],
+                "category": cat,
+                "name": [f"{cat} {i}" for i in range(n)],
+            }
+        )
+        next_id += n
+    return cache
+
+
+def prepare_state(seed: int):
+    """
+    Fills app.state.app_state the way the startup hook does, from synthetic data.
+    """
+    rng = np.random.default_rng(seed)
+    st = app.state.app_state
+
+    st.network = StubNetwork()
+    st.network_status = "ready"
+
+    st.df_grid = fake_grid(rng)
+    st.grid_version = data_version(st.df_grid)
+    st.districts_gdf = fake_districts()
+    st.district_payloads = build_district_payloads(st.districts_gdf)
+
+    st.poi_cache = fake_poi_cache(rng)
+    st.poi_version = data_version(*st.poi_cache.values())
+
+    print(
+        f"Fake state: {len(st.df_grid)} cells, {len(st.districts_gdf)} districts, "
+        f"{sum(len(df) for df in st.poi_cache.values())} POIs"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Sessions
+# ---------------------------------------------------------------------------
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.loop_lag = []
+
+    def record(self, name: str, seconds: float, ok: bool):
+        self.latencies[name].append(seconds)
+        if not ok:
+            self.errors[name] += 1
+
+
+def _random_bbox(rng: random.Random, size_deg: float) -> tuple[float, float, float, float]:
+    lon = CENTER_LON + rng.uniform(-0.6, 0.6) * AREA_HALF_DEG[0]
+    lat = CENTER_LAT + rng.uniform(-0.6, 0.6) * AREA_HALF_DEG[1]
+    return lon - size_deg, lat - size_deg * 0.6, lon + size_deg, lat + size_deg * 0.6
+
+
+async def _call(client: httpx.AsyncClient, stats: Stats, name: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        res = await client.request(method, url, **kwargs)
+        ok = res.status_code < 400
+    except Exception as e:
+        print(f"[{name}] {type(e).__name__}: {e}")
+        res, ok = None, False
+    stats.record(name, time.perf_counter() - started, ok)
+    return res
+
+
+async def planner_session(client: httpx.AsyncClient, stats: Stats, rng: random.Random, think: float):
+    """
+    One frontend session: map load, isochrone clicks, cityscope pans, slider moves and scenario edits.
+    """
+    cats = list(CATS)
+
+    async def pause():
+        if think > 0:
+            await asyncio.sleep(rng.expovariate(1.0 / think))
+
+    # Map load: districts (revalidated with the previous ETag like a browser) and grid
+    res = await _call(client, stats, "GET /api/districts", "GET", "/api/districts", params={"zoom": 12})
+    if res is not None and "etag" in res.headers:
+        await _call(
+            client, stats, "GET /api/districts", "GET", "/api/districts",
+            params={"zoom": 12}, headers={"If-None-Match": res.headers["etag"]},
+        )
+
+    bbox = _random_bbox(rng, 0.01)
+    await _call(client, stats, "GET /api/grid", "GET", "/api/grid", params={"bbox": ",".join(map(str, bbox))})
+    await pause()
+
+    # Reach map: isochrone clicks followed by POI lookups in the isochrone bbox
+    for _ in range(2):
+        lon = CENTER_LON + rng.uniform(-0.5, 0.5) * AREA_HALF_DEG[0]
+        lat = CENTER_LAT + rng.uniform(-0.5, 0.5) * AREA_HALF_DEG[1]
+        mode = rng.choice(["walk", "bike"])
+        await _call(
+            client, stats, "POST /api/isochrone", "POST", "/api/isochrone",
+            json={"lat": lat, "lon": lon, "mode": mode, "thresholds": [5, 10, 15]},
+        )
+        await _call(
+            client, stats, "POST /api/pois", "POST", "/api/pois",
+            json={"bbox": [lat - 0.01, lon - 0.015, lat + 0.01, lon + 0.015], "categories": cats},
+        )
+        await pause()
+
+    # CityScope: initial ROI, pans, slider moves, scenario edits
+    body = {
+        "bbox": ",".join(map(str, _random_bbox(rng, 0.012))),
+        "categories": cats,
+        "mode": "walk",
+        "currentMinutes": 15,
+        "user_pois": [],
+        "removed_poi_ids": [],
+    }
+
+    async def cityscope(label: str):
+        await _call(client, stats, f"POST /api/cityscope ({label})", "POST", "/api/cityscope", json=body)
+        await pause()
+
+    await cityscope("initial")
+
+    for _ in range(2):
+        body["bbox"] = ",".join(map(str, _random_bbox(rng, 0.012)))
+        await cityscope("pan")
+
+    for minutes in rng.sample([5, 10, 20, 25, 30], 2):
+        body["currentMinutes"] = minutes
+        await cityscope("slider")
+
+    body["user_pois"] = [
+        {
+            "lat": CENTER_LAT + rng.uniform(-0.3, 0.3) * AREA_HALF_DEG[1],
+            "lon": CENTER_LON + rng.uniform(-0.3, 0.3) * AREA_HALF_DEG[0],
+            "category": rng.choice(cats),
+            "name": "Neu",
+        }
+    ]
+    body["removed_poi_ids"] = [rng.randint(1, 50)]
+    await cityscope("scenario")
+
+
+async def monitor_loop(stats: Stats, stop: asyncio.Event, interval: float = 0.01):
+    """
+    Samples event-loop lag: how late a short sleep wakes up. Large values mean a
+    handler blocked the loop (e.g. synchronous routing inside an async route).
+    """
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(time.perf_counter() - started - interval)
+
+
+async def run(users: int, sessions: int, think: float, seed: int, timeout: float) -> tuple[Stats, float]:
+    stats = Stats()
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for i in range(sessions):
+            queue.put_nowait(i)
+
+        async def user(worker: int):
+            while True:
+                try:
+                    session_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await planner_session(client, stats, random.Random(seed * 1_000_003 + session_id), think)
+
+        monitor = asyncio.create_task(monitor_loop(stats, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(users)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+
+    return stats, elapsed
+
+
+def report(stats: Stats, elapsed: float) -> dict:
+    rows = {}
+    for name in sorted(stats.latencies):
+        lat_ms = np.array(stats.latencies[name]) * 1000.0
+        rows[name] = {
+            "requests": len(lat_ms),
+            "errors": stats.errors[name],
+            "error_rate": stats.errors[name] / len(lat_ms),
+            "throughput_rps": len(lat_ms) / elapsed,
+            "p50_ms": float(np.percentile(lat_ms, 50)),
+            "p95_ms": float(np.percentile(lat_ms, 95)),
+            "p99_ms": float(np.percentile(lat_ms, 99)),
+        }
+
+    header = f"{'endpoint':<34} {'req':>6} {'err%':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print()
+    print(header)
+    print("-" * len(header))
+    for name, r in rows.items():
+        print(
+            f"{name:<34} {r['requests']:>6} {r['error_rate'] * 100:>5.1f}% {r['throughput_rps']:>8.2f} "
+            f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}"
+        )
+
+    lag_ms = np.array(stats.loop_lag or [0.0]) * 1000.0
+    loop = {
+        "p99_ms": float(np.percentile(lag_ms, 99)),
+        "max_ms": float(lag_ms.max()),
+    }
+    print(f"\nTotal: {sum(r['requests'] for r in rows.values())} requests in {elapsed:.1f}s")
+    print(f"Event-loop lag: p99 {loop['p99_ms']:.1f} ms, max {loop['max_ms']:.1f} ms")
+
+    return {"elapsed_s": elapsed, "endpoints": rows, "event_loop_lag": loop}
+
+
+def main():
+    """
+    Replays realistic frontend sessions against the FastAPI app in-process.
+
+    The app runs on synthetic data with a stub router (straight-line travel times
+    with simulated routing cost) and a fake POI cache, so no OSM/R5/Overpass data is
+    needed. Reports per-endpoint throughput, latency percentiles, error rates and
+    event-loop lag at the configured concurrency.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--sessions", type=int, default=50, help="total sessions to replay")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between actions (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    install_stub_router()
+    prepare_state(args.seed)
+
+    stats, elapsed = asyncio.run(run(args.users, args.sessions, args.think, args.seed, args.timeout))
+    result = report(stats, elapsed)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), **result}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()